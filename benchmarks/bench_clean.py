@@ -0,0 +1,97 @@
+"""Benchmark the description cleaner on a synthetic corpus.
+
+Compares the previous cleaner (one regex per header pattern, regex bullet
+rewrite, 8 threads) with the current one (combined alternations, string
+bullet check, chunked process pool) and checks both give the same output.
+
+    python benchmarks/bench_clean.py [--jobs 50000] [--processes N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import clean_job_details as cleaner
+from corpus import synthetic_corpus
+
+# The cleaner as it was before combined patterns and the process pool
+LEGACY_KEEP = [re.compile(p, re.I) for p in cleaner.KEEP_HEADERS]
+LEGACY_SKIP = [re.compile(p, re.I) for p in cleaner.SKIP_HEADERS]
+
+
+def legacy_clean_description(text):
+    if not text:
+        return ""
+    cleaned_blocks = []
+    keep_current_block = True
+    for line in text.split("\n"):
+        stripped_line = line.strip()
+        if not stripped_line:
+            continue
+        is_header = len(stripped_line) < 80 and (stripped_line[0].isupper() or stripped_line.endswith(':'))
+        if is_header:
+            lower_line = stripped_line.lower()
+            if any(p.search(lower_line) for p in LEGACY_SKIP):
+                keep_current_block = False
+                continue
+            if any(p.search(lower_line) for p in LEGACY_KEEP):
+                keep_current_block = True
+                cleaned_blocks.append(stripped_line)
+                continue
+        if keep_current_block:
+            cleaned_blocks.append(re.sub(r'^\s*[\*•]\s+', '- ', stripped_line))
+    result_text = "\n".join(cleaned_blocks)
+    if len(result_text) > cleaner.MAX_CHARS:
+        trunc_index = result_text.rfind("\n", 0, cleaner.MAX_CHARS)
+        if trunc_index != -1:
+            result_text = result_text[:trunc_index] + "\n[...Truncated due to length...]"
+        else:
+            result_text = result_text[:cleaner.MAX_CHARS] + "\n[...Truncated...]"
+    return result_text
+
+
+def legacy_clean_jobs(jobs):
+    def process(url, details):
+        return url, legacy_clean_description(details.get("description", ""))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        return dict(executor.map(process, jobs.keys(), jobs.values()))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=50000)
+    parser.add_argument("--processes", type=int, default=cleaner.CLEAN_PROCESSES)
+    args = parser.parse_args()
+
+    jobs = synthetic_corpus(args.jobs)
+    print(f"{len(jobs)} synthetic descriptions, {sum(len(j['description']) for j in jobs.values()) / 1e6:.1f} MB")
+
+    legacy, legacy_seconds = timed(legacy_clean_jobs, jobs)
+    single, single_seconds = timed(cleaner.clean_jobs, jobs, 1)
+    pooled, pooled_seconds = timed(cleaner.clean_jobs, jobs, args.processes)
+
+    for result in (single, pooled):
+        mismatches = sum(
+            1 for url, text in legacy.items()
+            if result[url]["cleaned_text"] != f"{jobs[url]['title']}\n\n{text}"
+        )
+        if mismatches:
+            print(f"WARNING: {mismatches} descriptions differ from the previous cleaner")
+
+    print(f"{'previous cleaner, 8 threads':<32}{legacy_seconds:7.2f}s")
+    print(f"{'new cleaner, 1 process':<32}{single_seconds:7.2f}s  {legacy_seconds / single_seconds:5.1f}x")
+    print(f"{f'new cleaner, pool of {args.processes}':<32}{pooled_seconds:7.2f}s  {legacy_seconds / pooled_seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
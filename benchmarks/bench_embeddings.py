@@ -0,0 +1,164 @@
+"""Compare the embedding backends and check they rank like fp32.
+
+Each backend runs in its own process on the same fixed synthetic corpus.
+The script records how long the model takes to load, how much memory
+loading it adds, and how fast it encodes. Then it checks that every backend
+ranks documents like the fp32 torch backend: on average, at least
+AGREEMENT_THRESHOLD of each query's fp32 top-10 documents must also be in
+the backend's top-10.
+
+    python benchmarks/bench_embeddings.py [--backends torch,torch-int8,onnx,onnx-int8]
+                                          [--docs 2000] [--threads N] [--output report.json]
+
+Exits with 1 if a backend falls below the threshold or fails to run. The
+model must be downloadable or already cached; the onnx backends also need
+`pip install optimum[onnxruntime]`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+import embedding_backend
+from corpus import synthetic_jobs
+
+# Searches the corpus is ranked for
+QUERIES = [
+    "Senior Python backend engineer with Django and AWS",
+    "Junior data engineer building pipelines in the cloud",
+    "Platform engineer deploying and monitoring scalable services",
+    "Machine learning engineer shipping models to production",
+    "Staff engineer leading code review and testing practices",
+    "Remote API developer working closely with customers",
+    "Lead engineer growing a product team on a mission",
+    "Backend developer designing systems for millions of users",
+    "DevOps engineer automating deployment and monitoring",
+    "Full stack engineer delivering features end to end",
+]
+
+
+def current_rss():
+    """Resident memory of this process in bytes (Linux), else its peak."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import metrics
+        return metrics.peak_rss() or 0
+
+
+def fixed_corpus(size):
+    _, details = synthetic_jobs(size, ["bench"], seed=42)
+    return [f"{d['title']}\n\n{d['description']}" for d in details.values()]
+
+
+def run_backend(args):
+    """Entry point of a backend's process: load, encode, save the vectors."""
+    # Import the libraries first so the memory delta is the model's own
+    import sentence_transformers  # noqa: F401
+    from encoding import EncodingEngine
+
+    docs = fixed_corpus(args.docs)
+    before = current_rss()
+    start = time.perf_counter()
+    model = embedding_backend.load_model(args.model, args.child, args.threads)
+    load_seconds = time.perf_counter() - start
+    memory = current_rss() - before
+
+    engine = EncodingEngine(model, processes=1)
+    engine.encode(docs[:32])  # warm-up
+    start = time.perf_counter()
+    doc_vectors = engine.encode(docs)
+    encode_seconds = time.perf_counter() - start
+    query_vectors = engine.encode(QUERIES)
+
+    np.savez(args.vectors, docs=doc_vectors, queries=query_vectors)
+    with open(args.result, 'w', encoding='utf-8') as f:
+        json.dump({
+            "load_seconds": load_seconds,
+            "memory_bytes": memory,
+            "encode_seconds": encode_seconds,
+            "texts_per_second": len(docs) / encode_seconds
+        }, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(embedding_backend.BACKENDS))
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--docs", type=int, default=2000, help="size of the fixed corpus")
+    parser.add_argument("--threads", type=int, default=embedding_backend.EMBED_THREADS)
+    parser.add_argument("--output", help="also write the results as JSON")
+    # Internal: run one backend in its own process
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args)
+        return
+
+    # fp32 torch is the reference every other backend is checked against
+    backends = ["torch"] + [b for b in args.backends.split(',') if b and b != "torch"]
+    results, vectors = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            print(f"Running {backend}...", flush=True)
+            vectors_path = os.path.join(tmp, f"{backend}.npz")
+            result_path = os.path.join(tmp, f"{backend}.json")
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', backend, '--model', args.model,
+                 '--docs', str(args.docs), '--threads', str(args.threads),
+                 '--vectors', vectors_path, '--result', result_path],
+                capture_output=True, text=True
+            )
+            if process.returncode != 0:
+                error = (process.stderr or process.stdout).strip().splitlines()
+                results[backend] = {"error": error[-1] if error else f"exit code {process.returncode}"}
+                continue
+            with open(result_path, encoding='utf-8') as f:
+                results[backend] = json.load(f)
+            with np.load(vectors_path) as data:
+                vectors[backend] = (data["docs"], data["queries"])
+
+    if "torch" not in vectors:
+        print(f"The fp32 torch reference failed: {results['torch']['error']}")
+        sys.exit(1)
+
+    reference = results["torch"]
+    failed = []
+    print(f"{'backend':<12}{'load s':>9}{'memory MB':>11}{'texts/s':>10}{'speedup':>9}{'top-10 agreement':>18}")
+    for backend in backends:
+        result = results[backend]
+        if "error" in result:
+            failed.append(backend)
+            print(f"{backend:<12}  {result['error']}")
+            continue
+        result["speedup"] = result["texts_per_second"] / reference["texts_per_second"]
+        result["memory_ratio"] = result["memory_bytes"] / reference["memory_bytes"] if reference["memory_bytes"] else None
+        result["agreement"] = embedding_backend.ranking_agreement(*vectors["torch"], *vectors[backend])
+        result["passed"] = result["agreement"] >= embedding_backend.AGREEMENT_THRESHOLD
+        if not result["passed"]:
+            failed.append(backend)
+        print(f"{backend:<12}{result['load_seconds']:9.2f}{result['memory_bytes'] / 1e6:11.1f}"
+              f"{result['texts_per_second']:10.1f}{result['speedup']:8.2f}x{result['agreement']:18.3f}"
+              + ("" if result["passed"] else "  BELOW THRESHOLD"))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"model": args.model, "docs": args.docs, "threads": args.threads,
+                       "threshold": embedding_backend.AGREEMENT_THRESHOLD, "backends": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+"""Offline benchmarks for the scrapers, the pipeline stages and the API.
+
+Everything runs in a throwaway copy of src/ with its own database. The
+scrapers read the fixture pages from a local stand-in (standin.py); cleaning,
+dedup, matching and the Flask endpoints run on synthetic corpora of each of
+--sizes jobs. Results are written as JSON so runs on different commits can
+be compared:
+
+    python benchmarks/bench_pipeline.py [--sizes 1000,10000,100000] [--output report.json]
+    python benchmarks/bench_pipeline.py --compare old.json new.json
+
+The report also holds the cold import time of app, pipeline and matching
+against IMPORT_BUDGET_SECONDS, and whether any of them imported torch.
+
+Each part runs in its own process, so peak memory is per part. No network
+is used: listing pages need Chromium and matching needs the embedding model
+in the local cache, and each is reported as skipped when missing (matches
+are then seeded so the endpoints still have data).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(REPO_DIR, 'src')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+DEFAULT_SIZES = "1000,10000,100000"
+
+# Share of synthetic jobs that get a match when matching is skipped
+SEEDED_MATCH_SHARE = 0.1
+
+# Requests per endpoint after the first (cold) one
+ENDPOINT_REPEAT = 20
+
+ENDPOINTS = {
+    "/api/jobs": "/api/jobs?page=1&per_page=20",
+    "/api/jobs search": "/api/jobs?page=1&per_page=20&search=python",
+    "/api/matching/jobs": "/api/matching/jobs?page=1&per_page=20&sort=score",
+    "/api/matching/jobs search": "/api/matching/jobs?page=1&per_page=20&sort=date&search=python",
+}
+
+# A timing this much slower than the baseline is flagged by --compare
+REGRESSION_TOLERANCE = 0.10
+
+# Import-time budget (seconds) of the modules the server and pipeline load;
+# none of them should import torch until something needs encoding
+IMPORT_BUDGET_SECONDS = {"app": 1.0, "pipeline": 1.5, "matching": 0.5}
+IMPORT_RUNS = 3
+
+# Prints how long the statement took and whether it imported torch
+PROBE = "import sys, time; start = time.perf_counter(); {statement}; print(time.perf_counter() - start, 'torch' in sys.modules)"
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def stage_result(seconds, items):
+    return {"seconds": seconds, "items": items, "items_per_second": items / seconds if seconds else 0.0}
+
+
+# --- workspace ------------------------------------------------------------
+
+def make_workspace(root, name):
+    """Copy of src/ (code and resumes, no data) to run one part in."""
+    workspace = os.path.join(root, name)
+    os.makedirs(os.path.join(workspace, 'static'))
+    for path in glob.glob(os.path.join(SRC_DIR, '*.py')):
+        shutil.copy(path, workspace)
+    for filename in ('sites.json', 'job-details-scraping-map.json', 'resume.md'):
+        shutil.copy(os.path.join(SRC_DIR, 'static', filename), os.path.join(workspace, 'static'))
+    if os.path.isdir(os.path.join(SRC_DIR, 'static/resumes')):
+        shutil.copytree(os.path.join(SRC_DIR, 'static/resumes'), os.path.join(workspace, 'static/resumes'))
+    return workspace
+
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def probe(statement, workspace):
+    """(seconds, imported_torch) for `statement` run in a fresh interpreter."""
+    env = dict(os.environ, HF_HUB_OFFLINE='1', TRANSFORMERS_OFFLINE='1')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(statement=statement)],
+        cwd=workspace, env=env, capture_output=True, text=True, check=True
+    ).stdout.splitlines()[-1].split()
+    return float(output[0]), output[1] == 'True'
+
+
+def bench_imports(root):
+    """Cold import time of each module in IMPORT_BUDGET_SECONDS (best of IMPORT_RUNS)."""
+    workspace = make_workspace(root, 'imports')
+    results = {}
+    for module, budget in IMPORT_BUDGET_SECONDS.items():
+        samples = [probe(f"import {module}", workspace) for _ in range(IMPORT_RUNS)]
+        seconds = min(seconds for seconds, _ in samples)
+        results[module] = {
+            "seconds": seconds,
+            "budget_seconds": budget,
+            "within_budget": seconds <= budget,
+            "imports_torch": samples[0][1]
+        }
+    return results
+
+
+# --- scraping (runs in the workspace process) -----------------------------
+
+async def chromium_error():
+    """Why Chromium can't be launched, or None if it can."""
+    from playwright.async_api import async_playwright
+    try:
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(headless=True)
+            await browser.close()
+    except Exception as e:
+        return str(e).strip().splitlines()[0]
+    return None
+
+
+def bench_scrape(workspace, args):
+    """Scrape the fixture pages through the stand-in."""
+    from standin import StandIn, ITEMS_PER_PAGE, load_config
+
+    standin = StandIn().start()
+    sites, scraping_map = load_config()
+    for site in sites:
+        site['url'] = standin.listing_url(site['name'])
+    for config in scraping_map.values():
+        # The fixtures are static HTML, so no site needs a browser for details
+        if not args.browser:
+            config['fetch_mode'] = 'http'
+    if not args.keep_rates:
+        # The stand-in doesn't need to be protected from load
+        for config in sites + list(scraping_map.values()):
+            config.pop('rate', None)
+            config.pop('max_concurrency', None)
+    write_json(os.path.join(workspace, 'static/sites.json'), sites)
+    write_json(os.path.join(workspace, 'static/job-details-scraping-map.json'), scraping_map)
+
+    import scrape_details
+    import scrape_urls
+    from storage import JobStore
+
+    result = {}
+    error = asyncio.run(chromium_error())
+    if error is None:
+        _, seconds = timed(asyncio.run, scrape_urls.scrape_urls())
+        with JobStore() as store:
+            result["scrape_urls"] = stage_result(seconds, store.count_jobs())
+    else:
+        result["scrape_urls"] = {"skipped": f"Chromium unavailable: {error}"}
+        # Seed the URLs the listing pages would have produced
+        with JobStore() as store:
+            store.add_jobs([
+                {"site": site['name'], "url": standin.job_url(site['name'], f"p{page}-{i}"),
+                 "found_at": datetime.now().isoformat()}
+                for site in sites
+                for page in range(1, (site.get('pagination') or {}).get('max_pages', 1) + 1)
+                for i in range(1, ITEMS_PER_PAGE + 1)
+            ])
+
+    _, seconds = timed(asyncio.run, scrape_details.scrape_details())
+    with JobStore() as store:
+        result["scrape_details"] = stage_result(seconds, store.count_details())
+    result["standin_requests"] = standin.requests
+    standin.stop()
+    return result
+
+
+# --- corpus stages and endpoints (run in the workspace process) -----------
+
+def seed_matches(store, share=SEEDED_MATCH_SHARE, seed=0):
+    rng = random.Random(seed)
+    cleaned = store.get_cleaned()
+    now = datetime.now().isoformat()
+    store.save_matches([
+        {"url": url, "title": job["title"], "score": rng.uniform(0.5, 0.9), "matched_at": now,
+         "is_new": True, "status": "matched", "resume": "resume", "alternate_urls": []}
+        for url, job in cleaned.items() if rng.random() < share
+    ])
+
+
+def bench_endpoints(repeat):
+    import app
+
+    client = app.app.test_client()
+    results = {}
+    for name, url in ENDPOINTS.items():
+        start = time.perf_counter()
+        response = client.get(url)
+        cold = time.perf_counter() - start
+        if response.status_code != 200:
+            results[name] = {"error": f"HTTP {response.status_code}"}
+            continue
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client.get(url)
+            times.append(time.perf_counter() - start)
+        times.sort()
+        results[name] = {
+            "cold_ms": cold * 1000,
+            "mean_ms": statistics.mean(times) * 1000,
+            "p50_ms": times[len(times) // 2] * 1000,
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+            "bytes": len(response.data)
+        }
+    return results
+
+
+def bench_corpus(workspace, args):
+    """Import a synthetic corpus, run each stage on it and time the API."""
+    from corpus import synthetic_jobs
+    from standin import load_config
+
+    sites = [site['name'] for site in load_config()[0]]
+    jobs, details = synthetic_jobs(args.size, sites)
+    write_json(os.path.join(workspace, 'static/jobs.json'), jobs)
+    write_json(os.path.join(workspace, 'static/job_details.json'), details)
+    del jobs, details
+
+    import clean_job_details
+    import dedup
+    import import_json
+    import metrics
+    from storage import JobStore
+
+    result = {}
+    _, seconds = timed(import_json.main)
+    result["import"] = stage_result(seconds, args.size)
+
+    _, seconds = timed(clean_job_details.main)
+    with JobStore() as store:
+        result["clean_job_details"] = stage_result(seconds, len(store.cleaned_urls()))
+
+    _, seconds = timed(dedup.main)
+    with JobStore() as store:
+        result["dedup"] = stage_result(seconds, args.size)
+        result["dedup"]["duplicates"] = len(store.get_duplicates())
+
+    try:
+        import matching
+        _, load_seconds = timed(matching.get_model)
+    except Exception as e:
+        result["matching"] = {"skipped": f"Embedding model unavailable offline: {str(e).splitlines()[0]}"}
+        with JobStore() as store:
+            seed_matches(store)
+        result["matches_seeded"] = True
+    else:
+        _, seconds = timed(matching.match_jobs)
+        with JobStore() as store:
+            result["matching"] = stage_result(seconds, args.size - len(store.get_duplicates()))
+            result["matching"]["model_load_seconds"] = load_seconds
+            result["matching"]["matches"] = store.count_matches()
+        # A rerun with nothing changed, from a cold start like a new pipeline run
+        seconds, imported_torch = probe("import matching; matching.match_jobs()", workspace)
+        result["matching_no_change"] = {"seconds": seconds, "imports_torch": imported_torch}
+
+    result["endpoints"] = bench_endpoints(args.repeat)
+    result["peak_rss_bytes"] = metrics.peak_rss()
+    return result
+
+
+def run_part(args):
+    """Entry point of a part's process (--part), run inside its workspace."""
+    workspace = os.path.abspath(args.workspace)
+    sys.path.insert(0, workspace)
+    os.chdir(workspace)
+    if args.part == 'scrape':
+        result = bench_scrape(workspace, args)
+    else:
+        result = bench_corpus(workspace, args)
+    write_json(args.result, result)
+
+
+# --- driver ---------------------------------------------------------------
+
+def spawn_part(root, name, part_args, args):
+    """Run one part in a fresh workspace process; returns its results."""
+    workspace = make_workspace(root, name)
+    result_path = os.path.join(workspace, 'result.json')
+    log_path = os.path.join(workspace, 'output.log')
+    env = dict(os.environ, HF_HUB_OFFLINE='1', TRANSFORMERS_OFFLINE='1', PYTHONUNBUFFERED='1')
+    command = [sys.executable, os.path.abspath(__file__), '--workspace', workspace, '--result', result_path,
+               '--repeat', str(args.repeat), *part_args]
+    if args.browser:
+        command.append('--browser')
+    if args.keep_rates:
+        command.append('--keep-rates')
+
+    print(f"Running {name}...", flush=True)
+    with open(log_path, 'w', encoding='utf-8') as log_file:
+        process = subprocess.run(command, stdout=log_file, stderr=subprocess.STDOUT, env=env)
+    if process.returncode != 0 or not os.path.exists(result_path):
+        with open(log_path, encoding='utf-8') as f:
+            tail = f.read().splitlines()[-20:]
+        print("\n".join(tail))
+        return {"error": f"exited with code {process.returncode}"}
+    with open(result_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--', 'src'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def timings(report, path=()):
+    """(path, value) for every timing in a report."""
+    for key, value in report.items():
+        if isinstance(value, dict):
+            yield from timings(value, path + (key,))
+        elif (isinstance(value, (int, float)) and (key.endswith('seconds') or key.endswith('_ms'))
+              and key not in ('items_per_second', 'budget_seconds')):
+            yield " / ".join(path + (key,)), value
+
+
+def compare(base, new, tolerance=REGRESSION_TOLERANCE):
+    """Print each timing of `new` against `base`; returns the regressions."""
+    base_timings = dict(timings(base))
+    print(f"{'timing':<64}{str(base.get('commit'))[:10]:>12}{str(new.get('commit'))[:10]:>12}")
+    regressions = []
+    for path, value in timings(new):
+        if path not in base_timings:
+            continue
+        ratio = value / base_timings[path] if base_timings[path] else float('inf')
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  slower"
+            regressions.append(path)
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print(f"{path:<64}{base_timings[path]:12.4f}{value:12.4f}{ratio:8.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated corpus sizes")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--repeat", type=int, default=ENDPOINT_REPEAT, help="requests per endpoint")
+    parser.add_argument("--skip-scrape", action="store_true", help="only run the corpus benchmarks")
+    parser.add_argument("--browser", action="store_true", help="fetch details with each site's configured fetch_mode")
+    parser.add_argument("--keep-rates", action="store_true", help="keep the per-site rate limits from sites.json and the scraping map")
+    parser.add_argument("--keep-workspace", action="store_true", help="keep the workspaces and their logs")
+    parser.add_argument("--compare", nargs='+', metavar="REPORT", help="compare a baseline report with a newer one (or with this run)")
+    # Internal: run one part inside its workspace
+    parser.add_argument("--part", choices=['scrape', 'corpus'], help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workspace", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.part:
+        run_part(args)
+        return
+
+    if args.compare and len(args.compare) == 2:
+        with open(args.compare[0], encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            new = json.load(f)
+        sys.exit(1 if compare(base, new) else 0)
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "sizes": [int(size) for size in args.sizes.split(',') if size],
+        "corpus": {}
+    }
+
+    root = tempfile.mkdtemp(prefix='jobagent-bench-')
+    try:
+        print("Measuring import times...", flush=True)
+        report["imports"] = bench_imports(root)
+        if not args.skip_scrape:
+            report["scrape"] = spawn_part(root, 'scrape', ['--part', 'scrape'], args)
+        for size in report["sizes"]:
+            report["corpus"][str(size)] = spawn_part(root, f'corpus-{size}', ['--part', 'corpus', '--size', str(size)], args)
+    finally:
+        if args.keep_workspace:
+            print(f"Workspaces kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{(commit or 'unknown')[:10]}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
+
+    for path, value in timings(report):
+        print(f"{path:<64}{value:12.4f}")
+    for module, result in report["imports"].items():
+        if not result["within_budget"] or result["imports_torch"]:
+            print(f"WARNING: importing {module} took {result['seconds']:.2f}s (budget {result['budget_seconds']}s)"
+                  + (" and imported torch" if result["imports_torch"] else ""))
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            base = json.load(f)
+        sys.exit(1 if compare(base, report) else 0)
+
+
+if __name__ == "__main__":
+    main()
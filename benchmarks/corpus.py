@@ -0,0 +1,69 @@
+"""Synthetic job postings shared by the benchmarks."""
+import random
+from datetime import datetime, timedelta
+
+WORDS = (
+    "python django api design build team data remote cloud aws services "
+    "scalable product customers engineering deliver features code review "
+    "testing deploy monitor systems platform growth mission users"
+).split()
+
+HEADERS = [
+    "About us", "Requirements:", "What you will do", "Benefits", "Responsibilities",
+    "How to apply", "Tech Stack", "Equal Opportunity", "Who you are", "Perks",
+    "About the role", "Company Description", "Preferred qualifications:", "Salary"
+]
+
+
+def synthetic_description(rng):
+    lines = []
+    for _ in range(rng.randint(3, 7)):
+        lines.append(rng.choice(HEADERS))
+        for _ in range(rng.randint(2, 8)):
+            text = " ".join(rng.choices(WORDS, k=rng.randint(6, 25))).capitalize()
+            bullet = rng.choice(["* ", "• ", "- ", "", "  *   "])
+            lines.append(bullet + text)
+        lines.append("")
+    return "\n".join(lines)
+
+
+def synthetic_corpus(n, seed=0):
+    rng = random.Random(seed)
+    return {
+        f"https://example.com/jobs/{i}": {"title": f"Engineer {i}", "description": synthetic_description(rng)}
+        for i in range(n)
+    }
+
+
+def synthetic_jobs(n, sites, duplicate_share=0.05, seed=0):
+    """(jobs, details) in the legacy jobs.json / job_details.json formats.
+
+    Jobs are spread over `sites`; about `duplicate_share` of them repost an
+    earlier description with one line changed, like the same job on two
+    boards, so dedup has clusters to find.
+    """
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    jobs, details = [], {}
+    descriptions = []
+    for i in range(n):
+        site = sites[i % len(sites)]
+        url = f"https://{site.replace(' ', '-').lower()}.example/jobs/{i}"
+        found_at = (start + timedelta(minutes=i)).isoformat()
+        if descriptions and rng.random() < duplicate_share:
+            lines = rng.choice(descriptions).split("\n")
+            lines[rng.randrange(len(lines))] = "Apply through our careers page"
+            description = "\n".join(lines)
+        else:
+            description = synthetic_description(rng)
+            descriptions.append(description)
+        jobs.append({"url": url, "site": site, "found_at": found_at})
+        details[url] = {
+            "title": f"{rng.choice(['Senior', 'Junior', 'Staff', 'Lead', ''])} "
+                     f"{rng.choice(['Python', 'Backend', 'Data', 'Platform', 'ML'])} Engineer".strip(),
+            "description": description,
+            "scraped_at": found_at,
+            "seen": rng.random() < 0.5,
+            "last_seen": found_at
+        }
+    return jobs, details
@@ -0,0 +1,225 @@
+"""Local HTTP stand-in for the job boards, serving saved HTML fixtures.
+
+Each site in sites.json has a listing page and a detail page under
+benchmarks/fixtures/<site>/. The stand-in serves every listing page number
+from listing.html with its links rewritten to distinct local job URLs, and
+every job URL from detail.html, so the scrapers can run without a network.
+
+The fixtures checked in here are generated from the CSS selectors in
+sites.json and job-details-scraping-map.json. Replace a site's files with a
+page saved from the real board to benchmark against real markup.
+
+    python benchmarks/standin.py --write-fixtures   # regenerate from the selectors
+    python benchmarks/standin.py --port 8765        # serve until interrupted
+"""
+import argparse
+import html
+import json
+import os
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+from corpus import WORDS
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+
+# Items on each generated listing page
+ITEMS_PER_PAGE = 20
+
+HREF_RE = re.compile(r'href="[^"]*"')
+COMPOUND_RE = re.compile(r'#[\w-]+|\.[\w-]+|\[[^\]]+\]|[\w-]+')
+
+
+def load_config():
+    """(sites, scraping_map) from the app's static/ folder."""
+    with open(os.path.join(SRC_DIR, 'static/sites.json'), encoding='utf-8') as f:
+        sites = json.load(f)
+    with open(os.path.join(SRC_DIR, 'static/job-details-scraping-map.json'), encoding='utf-8') as f:
+        scraping_map = json.load(f)
+    return sites, scraping_map
+
+
+def slug(name):
+    return name.replace(' ', '-')
+
+
+def open_tag(compound):
+    """Opening and closing tag for a compound selector like div.a.b[role=list]."""
+    tag, attrs, classes = 'div', {}, []
+    for part in COMPOUND_RE.findall(compound):
+        if part.startswith('#'):
+            attrs['id'] = part[1:]
+        elif part.startswith('.'):
+            classes.append(part[1:])
+        elif part.startswith('['):
+            name, _, value = part[1:-1].partition('=')
+            attrs[name] = value.strip('"\'')
+        else:
+            tag = part
+    if classes:
+        attrs['class'] = ' '.join(classes)
+    rendered = ''.join(f' {k}="{html.escape(v)}"' for k, v in attrs.items())
+    return f'<{tag}{rendered}>', f'</{tag}>', tag
+
+
+def element(selector, inner, attrs=''):
+    """Markup matched by `selector` (descendant and child combinators only)
+    wrapping `inner`; `attrs` are added to the innermost element."""
+    parts = [p for p in re.split(r'\s*>\s*|\s+', selector.strip()) if p]
+    opened, closed = [], []
+    for i, part in enumerate(parts):
+        start, end, tag = open_tag(part)
+        if i == len(parts) - 1 and attrs:
+            start = start[:-1] + f' {attrs}>'
+        opened.append(start)
+        closed.append(end)
+    return ''.join(opened) + inner + ''.join(reversed(closed))
+
+
+def listing_fixture(site, rng):
+    """A listing page with ITEMS_PER_PAGE items matching the site's selectors."""
+    items = []
+    for i in range(ITEMS_PER_PAGE):
+        title = f"{rng.choice(['Senior', 'Junior', 'Staff', ''])} {rng.choice(['Python', 'Backend', 'Data', 'Platform'])} Engineer".strip()
+        inner = element(site['item_url'], html.escape(title), 'href="#"')
+        if site.get('item_title'):
+            inner += element(site['item_title'], html.escape(title))
+        if site.get('item_date'):
+            inner += element(site['item_date'], f"{i + 1}d", f'datetime="2026-01-{i % 28 + 1:02d}"')
+        item_tag = open_tag(site['list_item_selector'].split()[0])[2]
+        if item_tag == 'tr' and not site['list_item_selector'].startswith('tr > td'):
+            # Table rows need cells or the browser moves the content out
+            inner = f'<td>{inner}</td>'
+        items.append(element(site['list_item_selector'], inner))
+    body = element(site['list_selector'], '\n'.join(items))
+    return f'<!DOCTYPE html>\n<html><head><title>{html.escape(site["name"])}</title></head>\n<body>\n{body}\n</body></html>\n'
+
+
+def detail_fixture(selectors, rng):
+    """A detail page matching the site's title and description selectors.
+    "{{job}}" is replaced by the job id when served."""
+    paragraphs = []
+    for header in ("About the role", "Responsibilities", "Requirements:", "Benefits", "How to apply"):
+        paragraphs.append(f'<h3>{header}</h3>')
+        for _ in range(rng.randint(2, 6)):
+            paragraphs.append(f'<p>{" ".join(rng.choices(WORDS, k=rng.randint(8, 25))).capitalize()}</p>')
+    title = element(selectors['title'], 'Software Engineer {{job}}')
+    description = element(selectors['description'], '\n'.join(paragraphs))
+    return f'<!DOCTYPE html>\n<html><head><title>Job</title></head>\n<body>\n{title}\n{description}\n</body></html>\n'
+
+
+def write_fixtures(directory=FIXTURES_DIR, seed=0):
+    """Generate listing.html and detail.html for every site from its selectors."""
+    sites, scraping_map = load_config()
+    rng = random.Random(seed)
+    for site in sites:
+        site_dir = os.path.join(directory, slug(site['name']))
+        os.makedirs(site_dir, exist_ok=True)
+        with open(os.path.join(site_dir, 'listing.html'), 'w', encoding='utf-8') as f:
+            f.write(listing_fixture(site, rng))
+        selectors = scraping_map.get(site['name'])
+        if selectors:
+            with open(os.path.join(site_dir, 'detail.html'), 'w', encoding='utf-8') as f:
+                f.write(detail_fixture(selectors, rng))
+
+
+class StandIn:
+    """Serves /<site>/list (any page number) and /<site>/job/<id> from the fixtures."""
+
+    def __init__(self, directory=FIXTURES_DIR, port=0):
+        self.pages = {}
+        for name in os.listdir(directory):
+            for kind in ('listing', 'detail'):
+                path = os.path.join(directory, name, f'{kind}.html')
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        self.pages[(name, kind)] = f.read()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def listing_url(self, site_name):
+        return f"{self.base_url}/{quote(slug(site_name))}/list"
+
+    def job_url(self, site_name, job_id):
+        return f"{self.base_url}/{quote(slug(site_name))}/job/{job_id}"
+
+    def render(self, path, query):
+        parts = [unquote(p) for p in path.strip('/').split('/')]
+        if len(parts) == 2 and parts[1] == 'list' and (parts[0], 'listing') in self.pages:
+            # Each page number gets its own job ids
+            page = re.search(r'(?:^|&)\w+=(\d+)', query)
+            page = page.group(1) if page else '1'
+            links = iter(range(1, 10 ** 6))
+            return HREF_RE.sub(
+                lambda m: f'href="/{quote(parts[0])}/job/p{page}-{next(links)}"',
+                self.pages[(parts[0], 'listing')]
+            )
+        if len(parts) == 3 and parts[1] == 'job' and (parts[0], 'detail') in self.pages:
+            return self.pages[(parts[0], 'detail')].replace('{{job}}', html.escape(parts[2]))
+        return None
+
+    def _handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                standin.requests += 1
+                url = urlparse(self.path)
+                body = standin.render(url.path, url.query)
+                if body is None:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--write-fixtures", action="store_true", help="regenerate the fixtures from the selectors")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures()
+        print(f"Wrote fixtures to {FIXTURES_DIR}")
+        return
+
+    standin = StandIn(port=args.port)
+    print(f"Serving {len(standin.pages)} fixture pages on {standin.base_url} (Ctrl+C to stop)")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
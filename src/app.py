@@ -1,71 +1,115 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
+import asyncio
+import gzip
+import hashlib
 import json
 import subprocess
 import threading
 import os
 import sys
 from collections import deque
+from storage import JobStore
+from job_index import page_jobs
+import metrics
 
 # Base directory for resolving file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 app = Flask(__name__)
 
-# Status tracking for scraping operations
+# Largest page the listing endpoints will return
+MAX_PER_PAGE = 100
+
+# JSON responses at least this big are gzipped for clients that accept it
+GZIP_MIN_SIZE = 1024
+
+# Run matching inside this process so the embedding model stays loaded between
+# runs; set MATCHING_MODE=subprocess to launch matching.py like the other steps
+MATCHING_IN_PROCESS = os.environ.get('MATCHING_MODE', 'inprocess') == 'inprocess'
+
+# Load the embedding model in the background at startup so the first match
+# doesn't wait for it; MODEL_PRELOAD=0 starts fast and imports torch only
+# when a run actually has something to encode
+MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', '1') == '1'
+
+# Run "Scrape & Match" as one in-process pipeline whose stages overlap; set
+# PIPELINE_MODE=subprocess to run the scripts one after another instead
+PIPELINE_IN_PROCESS = os.environ.get('PIPELINE_MODE', 'inprocess') == 'inprocess'
+
+# Seconds between keep-alive comments on an idle event stream
+EVENT_KEEPALIVE = 15
+
+# Status tracking for scraping operations. `log_seq` counts every log line
+# ever added, so a client's cursor stays valid after old lines drop out of
+# the deque; `version` changes whenever the step, message or running flag do.
 scrape_status = {
     "running": False,
     "current_step": "",
     "message": "",
-    "logs": deque(maxlen=1000)
+    "logs": deque(maxlen=1000),
+    "log_seq": 0,
+    "run_start": 0,
+    "version": 0
 }
 
+# Wakes up event streams when a log line or the status changes
+status_changed = threading.Condition()
+
+def record_log(message):
+    """Append a line to the log view and wake up the event streams"""
+    with status_changed:
+        scrape_status["logs"].append(message)
+        scrape_status["log_seq"] += 1
+        status_changed.notify_all()
+
 def add_log(message):
     """Add a message to the logs"""
-    print(message)
-    scrape_status["logs"].append(message)
+    print(message, file=sys.__stdout__)
+    record_log(message)
 
-def load_jobs():
-    """Load jobs from jobs.json"""
-    try:
-        with open(os.path.join(BASE_DIR, 'static/jobs.json'), 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+def set_status(**changes):
+    """Update step/message/running and wake up the event streams"""
+    with status_changed:
+        scrape_status.update(changes)
+        scrape_status["version"] += 1
+        status_changed.notify_all()
 
-def load_job_details():
-    """Load job details from job_details.json"""
-    try:
-        with open(os.path.join(BASE_DIR, 'static/job_details.json'), 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+def logs_since(cursor):
+    """Log lines after `cursor` (a log_seq value) that are still buffered"""
+    logs = scrape_status["logs"]
+    first = scrape_status["log_seq"] - len(logs)
+    return list(logs)[max(0, cursor - first):]
 
-def load_matching_jobs():
-    """Load matching jobs from matching_jobs.json"""
-    try:
-        with open(os.path.join(BASE_DIR, 'static/matching_jobs.json'), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+def status_summary():
+    return {key: scrape_status[key] for key in ("running", "current_step", "message")}
 
 def get_stats():
     """Get scraping statistics"""
-    jobs = load_jobs()
-    details = load_job_details()
-    
-    sites = {}
-    for job in jobs:
-        site = job.get('site', 'unknown')
-        sites[site] = sites.get(site, 0) + 1
-    
-    seen_count = sum(1 for d in details.values() if d.get('seen', False))
-    
-    return {
-        "total_urls": len(jobs),
-        "total_details": len(details),
-        "seen_count": seen_count,
-        "sites": sites
-    }
+    with JobStore() as store:
+        return {
+            "total_urls": store.count_jobs(),
+            "total_details": store.count_details(),
+            "seen_count": store.count_seen(),
+            "expired_count": store.count_expired(),
+            "match_count": store.count_matches(),
+            "sites": store.site_counts()
+        }
+
+@app.after_request
+def compress_response(response):
+    """Gzip JSON responses for clients that accept it"""
+    if (response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/')
 def index():
@@ -75,58 +119,18 @@ def index():
 @app.route('/api/jobs')
 def api_jobs():
     """Get all jobs with their details (paginated, new jobs first)"""
-    jobs = load_jobs()
-    details = load_job_details()
-    
     # Pagination params
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    search = request.args.get('search', '').lower()
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(MAX_PER_PAGE, max(1, request.args.get('per_page', 20, type=int)))
+    search = request.args.get('search', '')
     site_filter = request.args.get('site', '')
     
-    # Merge job URLs with their details
-    result = []
-    for job in jobs:
-        url = job.get('url')
-        job_data = {
-            "site": job.get('site'),
-            "url": url,
-            "title": details.get(url, {}).get('title', 'Not scraped yet'),
-            "description": details.get(url, {}).get('description', ''),
-            "seen": details.get(url, {}).get('seen', False),
-            "last_seen": details.get(url, {}).get('last_seen', None),
-            "has_details": url in details
-        }
-        result.append(job_data)
-    
-    # Sort: new jobs first (not seen), then seen jobs
-    # Within each group, maintain original order (most recent additions at end)
-    result = sorted(result, key=lambda x: (x['seen'], 0), reverse=False)
-    # Reverse to show newest first (latest added jobs appear at top)
-    new_jobs = [j for j in result if not j['seen']]
-    seen_jobs = [j for j in result if j['seen']]
-    # Reverse to show most recently added first
-    new_jobs.reverse()
-    seen_jobs.reverse()
-    result = new_jobs + seen_jobs
-    
-    # Filter by search term
-    if search:
-        result = [j for j in result if 
-                  search in j['title'].lower() or 
-                  search in j['site'].lower() or 
-                  search in j['url'].lower()]
-    
-    # Filter by site
-    if site_filter:
-        result = [j for j in result if j['site'] == site_filter]
+    # Sorted, bucketed and token-indexed view, refreshed only when jobs change
+    with JobStore() as store:
+        paginated, total = page_jobs(store, page, per_page, search, site_filter)
     
     # Pagination
-    total = len(result)
     total_pages = (total + per_page - 1) // per_page
-    start = (page - 1) * per_page
-    end = start + per_page
-    paginated = result[start:end]
     
     return jsonify({
         "jobs": paginated,
@@ -146,7 +150,7 @@ def api_stats():
 def run_script(script_name, step_name):
     """Run a python script and capture its output to logs"""
     add_log(f"\n>>> Starting step: {step_name} ({script_name})")
-    scrape_status["current_step"] = step_name
+    set_status(current_step=step_name)
     
     # Force the subprocess to use the venv's site-packages
     env = os.environ.copy()
@@ -176,61 +180,235 @@ def run_script(script_name, step_name):
     process.wait()
     if process.returncode == 0:
         add_log(f">>> {step_name} completed successfully.")
+        # The script saved its run's metrics; add them to this process's totals
+        with JobStore() as store:
+            runs = store.recent_run_metrics(os.path.splitext(script_name)[0], limit=1)
+        if runs:
+            metrics.merge(runs[0])
         return True
     else:
         add_log(f">>> {step_name} failed with return code {process.returncode}.")
         return False
 
-@app.route('/api/scrape/full', methods=['POST'])
-def api_scrape_full():
-    """Trigger the full scraping and matching process"""
-    if scrape_status["running"]:
-        return jsonify({"success": False, "message": "Scrape already in progress"})
-    
-    def full_process():
-        scrape_status["running"] = True
-        scrape_status["logs"].clear()
-        scrape_status["message"] = "Starting full process..."
-        
-        steps = [
-            ('scrape_urls.py', 'Scraping URLs'),
-            ('scrape_details.py', 'Scraping Details'),
-            ('clean_job_details.py', 'Cleaning Job Details'),
-            ('matching.py', 'Running Matching')
-        ]
-        
+def run_matching(step_name):
+    """Run matching in this process, reusing the already loaded model"""
+    add_log(f"\n>>> Starting step: {step_name} (in-process)")
+    set_status(current_step=step_name)
+
+    import matching
+    # matching.log() already prints, so only feed the log view
+    matching.log_listeners.append(record_log)
+    try:
+        matching.match_jobs()
+    except Exception as e:
+        add_log(f">>> {step_name} failed: {e}")
+        return False
+    finally:
+        matching.log_listeners.remove(record_log)
+
+    add_log(f">>> {step_name} completed successfully.")
+    return True
+
+def run_pipeline(step_name):
+    """Run every stage in this process with overlapping stages (pipeline.py)"""
+    add_log(f"\n>>> Starting step: {step_name} (in-process)")
+    set_status(current_step=step_name)
+
+    import clean_job_details, dedup, embedding_backend, matching, pipeline, scrape_details, scrape_urls
+
+    def on_stage(running):
+        set_status(current_step=", ".join(running) or step_name)
+
+    # The stages' log() already prints, so only feed the log view
+    modules = (scrape_urls, scrape_details, clean_job_details, dedup, matching, embedding_backend, metrics, pipeline)
+    for module in modules:
+        module.log_listeners.append(record_log)
+    try:
+        asyncio.run(pipeline.run_pipeline(on_stage))
+    except Exception as e:
+        add_log(f">>> {step_name} failed: {e}")
+        return False
+    finally:
+        for module in modules:
+            module.log_listeners.remove(record_log)
+
+    add_log(f">>> {step_name} completed successfully.")
+    return True
+
+def run_step(script_name, step_name):
+    """Run one pipeline step, in-process for matching when enabled"""
+    if script_name == 'pipeline.py' and PIPELINE_IN_PROCESS:
+        return run_pipeline(step_name)
+    if script_name == 'matching.py' and MATCHING_IN_PROCESS:
+        return run_matching(step_name)
+    return run_script(script_name, step_name)
+
+def start_pipeline(steps, start_message, done_message):
+    """Run `steps` in a background thread unless a run is already going"""
+    with status_changed:
+        if scrape_status["running"]:
+            return False
+        # Event streams opened from now on start at this run's first line
+        set_status(running=True, message=start_message, run_start=scrape_status["log_seq"])
+
+    def process():
         success = True
         for script, step in steps:
-            if not run_script(script, step):
+            if not run_step(script, step):
                 success = False
-                scrape_status["message"] = f"Failed at: {step}"
+                set_status(message=f"Failed at: {step}")
                 break
         
         if success:
-            scrape_status["message"] = "Full process completed successfully!"
-            scrape_status["current_step"] = "Completed"
+            set_status(message=done_message, current_step="Completed")
         
-        scrape_status["running"] = False
+        set_status(running=False)
 
-    thread = threading.Thread(target=full_process)
+    thread = threading.Thread(target=process)
     thread.start()
+    return True
+
+@app.route('/api/scrape/full', methods=['POST'])
+def api_scrape_full():
+    """Trigger the full scraping and matching process"""
+    if PIPELINE_IN_PROCESS:
+        steps = [('pipeline.py', 'Scraping and Matching')]
+    else:
+        steps = [
+            ('scrape_urls.py', 'Scraping URLs'),
+            ('scrape_details.py', 'Scraping Details'),
+            ('clean_job_details.py', 'Cleaning Job Details'),
+            ('dedup.py', 'Removing Duplicates'),
+            ('matching.py', 'Running Matching')
+        ]
+    if not start_pipeline(steps, "Starting full process...", "Full process completed successfully!"):
+        return jsonify({"success": False, "message": "Scrape already in progress"})
     
     return jsonify({"success": True, "message": "Full scraping process started"})
 
+@app.route('/api/matching/run', methods=['POST'])
+def api_matching_run():
+    """Re-run only the matching step, e.g. after editing the resume"""
+    if not start_pipeline([('matching.py', 'Running Matching')], "Starting matching...", "Matching completed successfully!"):
+        return jsonify({"success": False, "message": "Scrape already in progress"})
+    
+    return jsonify({"success": True, "message": "Matching started"})
+
 @app.route('/api/scrape/status')
 def api_scrape_status():
-    """Get current scraping status and logs"""
-    # Convert deque to list for JSON serialization
-    status_copy = scrape_status.copy()
-    status_copy["logs"] = list(scrape_status["logs"])
-    return jsonify(status_copy)
+    """Get current scraping status and the current run's logs after `cursor`"""
+    with status_changed:
+        cursor = request.args.get('cursor', scrape_status["run_start"], type=int)
+        return jsonify({
+            **status_summary(),
+            "logs": logs_since(cursor),
+            "cursor": scrape_status["log_seq"]
+        })
+
+def sse(event, data, event_id=None):
+    """Format one Server-Sent Event"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/api/scrape/events')
+def api_scrape_events():
+    """Stream new log lines and status changes as Server-Sent Events.
+
+    Starts at the current run's first line, or after `Last-Event-ID` when
+    the browser reconnects, and ends with a `done` event once the run is over.
+    """
+    with status_changed:
+        cursor = request.headers.get('Last-Event-ID', type=int)
+        if cursor is None:
+            cursor = request.args.get('cursor', scrape_status["run_start"], type=int)
+
+    def generate():
+        nonlocal cursor
+        version = None
+        while True:
+            with status_changed:
+                status_changed.wait_for(
+                    lambda: scrape_status["log_seq"] > cursor or scrape_status["version"] != version,
+                    timeout=EVENT_KEEPALIVE
+                )
+                lines = logs_since(cursor)
+                cursor = scrape_status["log_seq"]
+                status = status_summary() if scrape_status["version"] != version else None
+                version = scrape_status["version"]
+
+            if not lines and status is None:
+                yield ": keep-alive\n\n"
+                continue
+            if lines:
+                yield sse("log", lines, cursor)
+            if status is not None:
+                yield sse("status", status)
+                if not status["running"]:
+                    yield sse("done", status)
+                    return
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @app.route('/api/matching/jobs')
 def api_matching_jobs():
-    """Get matching jobs list"""
-    matches = load_matching_jobs()
-    matches.reverse()
-    return jsonify(matches)
+    """Get a page of matching job summaries (no descriptions)"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(MAX_PER_PAGE, max(1, request.args.get('per_page', 20, type=int)))
+    sort = request.args.get('sort', 'date')
+    status = request.args.get('status', '')
+    search = request.args.get('search', '')
+    site_filter = request.args.get('site', '')
+
+    with JobStore() as store:
+        # Unchanged matches + same query = same page, so answer 304 early
+        etag = f"{store.revision('matches')}-{hashlib.sha1(request.query_string).hexdigest()[:12]}"
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers={"ETag": f'W/"{etag}"'})
+        matches, total = store.page_matches(page, per_page, sort, status, search, site_filter)
+
+    response = jsonify({
+        "jobs": matches,
+        "pagination": {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "total_pages": (total + per_page - 1) // per_page
+        }
+    })
+    response.set_etag(etag, weak=True)
+    return response
+
+@app.route('/api/matching/description')
+def api_matching_description():
+    """Get the description of one matching job"""
+    url = request.args.get('url', '')
+    with JobStore() as store:
+        description = store.get_match_description(url)
+    if description is None:
+        return jsonify({"error": "Match not found"}), 404
+
+    response = jsonify({"url": url, "description": description})
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Scraping, cleaning and matching metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics/runs')
+def api_metrics_runs():
+    """Metrics recorded by the latest stage runs, newest first"""
+    stage = request.args.get('stage', '')
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_PER_PAGE))
+    with JobStore() as store:
+        return jsonify(store.recent_run_metrics(stage, limit))
 
 @app.route('/api/jobs/view', methods=['POST'])
 def api_job_viewed():
@@ -242,20 +420,10 @@ def api_job_viewed():
         return jsonify({"success": False, "message": "No URL provided"}), 400
         
     try:
-        matches = load_matching_jobs()
-        updated = False
-        
-        for job in matches:
-            if job['url'] == url:
-                job['status'] = 'viewed'
-                # Also mark as not new if viewed
-                job['is_new'] = False 
-                updated = True
-                break
+        with JobStore() as store:
+            updated = store.mark_match_viewed(url)
         
         if updated:
-            with open(os.path.join(BASE_DIR, 'static/matching_jobs.json'), 'w', encoding='utf-8') as f:
-                json.dump(matches, f, indent=2, ensure_ascii=False)
             return jsonify({"success": True})
         else:
             return jsonify({"success": False, "message": "Job not found"}), 404
@@ -263,5 +431,13 @@ def api_job_viewed():
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+def warm_up_matching():
+    """Load the embedding model in the background so the first match is fast"""
+    import matching
+    matching.get_model()
+
 if __name__ == '__main__':
+    # With the debug reloader only the child process serves requests
+    if MATCHING_IN_PROCESS and MODEL_PRELOAD and os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        threading.Thread(target=warm_up_matching, daemon=True).start()
     app.run(debug=True, port=5001)
@@ -1,16 +1,22 @@
-import json
 import os
 import re
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial
-import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from storage import JobStore, CLEAN_STAGE, DEDUP_STAGE, MATCH_STAGE
+import metrics
 
 # Base directory for resolving file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 MAX_CHARS = 8000  # Soft truncation limit
 
+# Cleaning is CPU-bound Python, so big runs are spread over processes in
+# chunks; small runs aren't worth the process start-up
+CLEAN_PROCESSES = int(os.environ.get('CLEAN_PROCESSES', os.cpu_count() or 1))
+CLEAN_CHUNK_SIZE = 500
+MIN_JOBS_FOR_POOL = 2000
+
 # Compile regex patterns once for performance
 KEEP_HEADERS = [
     r'requirements', r'qualifications', r'what you need', r'who you are',
@@ -28,11 +34,20 @@ SKIP_HEADERS = [
     r'diversity', r'inclusion', r'eeo'
 ]
 
-KEEP_PATTERNS = [re.compile(p, re.I) for p in KEEP_HEADERS]
-SKIP_PATTERNS = [re.compile(p, re.I) for p in SKIP_HEADERS]
+# One alternation per list, so a header line is scanned once per list
+KEEP_PATTERN = re.compile("|".join(f"(?:{p})" for p in KEEP_HEADERS), re.I)
+SKIP_PATTERN = re.compile("|".join(f"(?:{p})" for p in SKIP_HEADERS), re.I)
+
+BULLETS = "*•"
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
 
 def log(message):
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
 
 def clean_description(text: str) -> str:
     """Cleans a job description by keeping relevant sections and removing noise."""
@@ -53,18 +68,19 @@ def clean_description(text: str) -> str:
 
         if is_header:
             lower_line = stripped_line.lower()
-            if any(p.search(lower_line) for p in SKIP_PATTERNS):
+            if SKIP_PATTERN.search(lower_line):
                 keep_current_block = False
                 continue
-            if any(p.search(lower_line) for p in KEEP_PATTERNS):
+            if KEEP_PATTERN.search(lower_line):
                 keep_current_block = True
                 cleaned_blocks.append(stripped_line)
                 continue
 
         if keep_current_block:
-            # Normalize bullets
-            normalized_line = re.sub(r'^\s*[\*•]\s+', '- ', stripped_line)
-            cleaned_blocks.append(normalized_line)
+            # Normalize "* item" / "• item" bullets to "- item"
+            if stripped_line[0] in BULLETS and len(stripped_line) > 1 and stripped_line[1].isspace():
+                stripped_line = '- ' + stripped_line[1:].lstrip()
+            cleaned_blocks.append(stripped_line)
 
     result_text = "\n".join(cleaned_blocks)
 
@@ -89,32 +105,74 @@ def process_job(url: str, details: dict) -> tuple:
         "cleaned_text": f"{title}\n\n{cleaned_text}"
     }
 
+def process_chunk(items: list) -> list:
+    """Clean a chunk of (url, details) pairs; runs in a worker process."""
+    return [process_job(url, details) for url, details in items]
+
+def clean_chunks(chunks, processes: int = CLEAN_PROCESSES):
+    """Clean an iterable of [(url, details)] chunks, yielding {url: cleaned}
+    per chunk in order. Only a few chunks per worker are in flight at once,
+    so memory stays bounded however many jobs there are."""
+    if processes <= 1:
+        for chunk in chunks:
+            yield dict(process_chunk(chunk))
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        in_flight = deque()
+        for chunk in chunks:
+            in_flight.append(executor.submit(process_chunk, chunk))
+            if len(in_flight) >= processes * 2:
+                yield dict(in_flight.popleft().result())
+        while in_flight:
+            yield dict(in_flight.popleft().result())
+
+def clean_jobs(jobs: dict, processes: int = CLEAN_PROCESSES) -> dict:
+    """Clean {url: details} into {url: cleaned}, in worker processes for big inputs."""
+    items = list(jobs.items())
+    if len(items) < MIN_JOBS_FOR_POOL:
+        processes = 1
+    chunks = (items[i:i + CLEAN_CHUNK_SIZE] for i in range(0, len(items), CLEAN_CHUNK_SIZE))
+    cleaned = {}
+    for results in clean_chunks(chunks, processes):
+        cleaned.update(results)
+    return cleaned
+
+@metrics.instrumented(CLEAN_STAGE)
 def main():
     try:
         log("Starting clean_job_details.py")
-        
-        # Load job details
-        try:
-            with open(os.path.join(BASE_DIR, "static/job_details.json"), "r", encoding="utf-8") as f:
-                jobs = json.load(f)
-        except FileNotFoundError:
-            log("Error: job_details.json not found.")
-            return
-
-        cleaned_jobs = {}
-
-        # Use ThreadPoolExecutor for parallel processing if jobs are many
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            for url, cleaned in executor.map(partial(process_job), jobs.keys(), jobs.values()):
-                cleaned_jobs[url] = cleaned
-
-        # Atomic write
-        output_path = os.path.join(BASE_DIR, "static/jobs_for_embedding.json")
-        with tempfile.NamedTemporaryFile("w", delete=False, encoding="utf-8") as tf:
-            json.dump(cleaned_jobs, tf, indent=2, ensure_ascii=False)
-        os.replace(tf.name, output_path)
-
-        log(f"Processed {len(cleaned_jobs)} jobs. Saved to jobs_for_embedding.json")
+
+        with JobStore() as store:
+            # Expired postings drop out of cleaning (and so out of matching)
+            detail_urls = store.detail_urls(include_expired=False)
+            if not detail_urls:
+                log("Error: no job details found. Run scrape_details.py first.")
+                return
+
+            cleaned_urls = store.cleaned_urls()
+            pending = store.get_pending(CLEAN_STAGE)
+
+            # Changed URLs plus anything that was never cleaned
+            to_clean = (pending & detail_urls) | (detail_urls - cleaned_urls)
+            removed = cleaned_urls - detail_urls
+
+            log(f"Cleaning {len(to_clean)} changed jobs, removing {len(removed)} ({len(cleaned_urls)} already cleaned).")
+
+            # Read, clean and save a chunk at a time
+            processes = CLEAN_PROCESSES if len(to_clean) >= MIN_JOBS_FOR_POOL else 1
+            cleaned_count = 0
+            for cleaned_jobs in clean_chunks(store.iter_detail_chunks(to_clean, CLEAN_CHUNK_SIZE), processes):
+                store.save_cleaned(cleaned_jobs)
+                cleaned_count += len(cleaned_jobs)
+                metrics.inc("stage_items_total", len(cleaned_jobs), stage=CLEAN_STAGE)
+
+            store.save_cleaned({}, removed)
+            store.mark_changed(DEDUP_STAGE, to_clean | removed)
+            store.mark_changed(MATCH_STAGE, to_clean | removed)
+            store.complete_stage(CLEAN_STAGE, pending | to_clean | removed)
+
+            log(f"Processed {cleaned_count} jobs. Total cleaned jobs: {len(cleaned_urls - removed | to_clean)}")
 
     except Exception as e:
         log(f"Critical error in clean_job_details: {e}")
@@ -0,0 +1,136 @@
+import re
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from storage import JobStore, DEDUP_STAGE, MATCH_STAGE
+import metrics
+
+# MinHash signature length, split into LSH bands of ROWS_PER_BAND rows.
+# Pairs collide in some band with probability 1 - (1 - J^8)^16, which is
+# ~60% at Jaccard 0.7 and >99% at 0.85.
+NUM_PERM = 128
+ROWS_PER_BAND = 8
+
+# Estimated Jaccard similarity above which two postings are the same job
+DUPLICATE_THRESHOLD = 0.8
+
+# Word n-grams used as shingles
+SHINGLE_SIZE = 5
+
+# Multiply-shift hash functions ((a * x + b) mod 2^64) >> 32, one per
+# permutation; fixed seeds so stored signatures stay comparable across runs
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
+def log(message):
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
+
+def shingles(text, size=SHINGLE_SIZE):
+    """32-bit hashes of the word n-grams of `text`."""
+    words = TOKEN_RE.findall(text.lower())
+    if len(words) < size:
+        words = words + [''] * (size - len(words))
+    return np.array(
+        sorted({zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}),
+        dtype=np.uint64
+    )
+
+def minhash(text):
+    """MinHash signature (NUM_PERM uint32 values) of `text`'s shingles."""
+    hashes = shingles(text)
+    # uint64 arithmetic wraps, which is the mod 2^64 the hash family needs
+    values = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) >> np.uint64(32)
+    return values.min(axis=1).astype(np.uint32)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.mean(a == b))
+
+def find_clusters(order, signatures, threshold=DUPLICATE_THRESHOLD):
+    """Group near-duplicate URLs. Returns {url: canonical_url} for every URL
+    that duplicates an earlier one in `order`."""
+    parent = {url: url for url in order}
+    rank = {url: i for i, url in enumerate(order)}
+
+    def find(url):
+        while parent[url] != url:
+            parent[url] = parent[parent[url]]
+            url = parent[url]
+        return url
+
+    # Only URLs sharing an LSH bucket in some band are compared
+    for band in range(NUM_PERM // ROWS_PER_BAND):
+        buckets = {}
+        rows = slice(band * ROWS_PER_BAND, (band + 1) * ROWS_PER_BAND)
+        for url in order:
+            buckets.setdefault(signatures[url][rows].tobytes(), []).append(url)
+        for members in buckets.values():
+            # Every pair, since a bucket can mix false-positive candidates
+            # with true duplicates that only collide in this band
+            for i, first in enumerate(members):
+                for url in members[i + 1:]:
+                    a, b = find(first), find(url)
+                    if a != b and similarity(signatures[first], signatures[url]) >= threshold:
+                        # The earliest-scraped posting stays canonical across runs
+                        if rank[a] > rank[b]:
+                            a, b = b, a
+                        parent[b] = a
+
+    return {url: find(url) for url in order if find(url) != url}
+
+@metrics.instrumented(DEDUP_STAGE)
+def main():
+    try:
+        log("Starting dedup.py")
+
+        with JobStore() as store:
+            jobs = store.get_cleaned()
+            if not jobs:
+                log("Error: no cleaned jobs found. Run clean_job_details.py first.")
+                return
+
+            pending = store.get_pending(DEDUP_STAGE)
+
+            # Signatures are cached, so only changed or new texts are hashed
+            signatures = {url: np.frombuffer(blob, dtype=np.uint32) for url, blob in store.get_signatures().items()}
+            stale = (pending & jobs.keys()) | (jobs.keys() - signatures.keys())
+            computed = {url: minhash(jobs[url]["cleaned_text"] or "") for url in stale}
+            removed = signatures.keys() - jobs.keys()
+            store.save_signatures({url: sig.tobytes() for url, sig in computed.items()}, removed)
+            signatures.update(computed)
+            metrics.inc("stage_items_total", len(computed), stage=DEDUP_STAGE)
+            log(f"Hashed {len(computed)} changed jobs ({len(jobs)} total).")
+
+            duplicates = find_clusters(list(jobs), signatures)
+            previous = store.get_duplicates()
+            store.save_duplicates(duplicates)
+
+            # Jobs whose canonical changed need rematching, as do their canonicals
+            moved = {
+                url for url in duplicates.keys() | previous.keys()
+                if duplicates.get(url) != previous.get(url)
+            }
+            moved |= {duplicates[url] for url in moved if url in duplicates}
+            moved |= {previous[url] for url in moved if url in previous}
+            store.mark_changed(MATCH_STAGE, (pending | moved | removed))
+            store.complete_stage(DEDUP_STAGE, pending, duplicates=len(duplicates))
+
+            clusters = len(set(duplicates.values()))
+            log(f"Found {len(duplicates)} duplicate postings of {clusters} jobs.")
+
+    except Exception as e:
+        log(f"Critical error in dedup: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+# Base directory for resolving file paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Exported ONNX models, one folder per model
+MODEL_DIR = os.path.join(BASE_DIR, 'static/models')
+
+# How the embedding model runs on CPU:
+#   torch       full-precision PyTorch (the reference)
+#   torch-int8  PyTorch with the Linear layers dynamically quantized to int8
+#   onnx        ONNX Runtime export of the same model
+#   onnx-int8   ONNX Runtime export with int8 dynamic quantization
+# The ONNX backends need `pip install optimum[onnxruntime]`.
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+EMBED_BACKEND = os.environ.get('EMBED_BACKEND', 'torch')
+
+# Intra-op threads used for encoding (0 = the library default, one per core)
+EMBED_THREADS = int(os.environ.get('EMBED_THREADS', 0))
+
+# Instruction set the int8 ONNX model is quantized for: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANTIZATION = os.environ.get('ONNX_QUANTIZATION', 'avx2')
+
+# A backend is fit to replace fp32 when, on average, this share of the
+# fp32 top-k results are also in its top-k
+AGREEMENT_THRESHOLD = 0.9
+AGREEMENT_TOP_K = 10
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
+def log(message):
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
+
+def model_id(model_name, backend=EMBED_BACKEND):
+    """Name that cached embeddings are tagged with; vectors from different
+    backends differ slightly, so each keeps its own cache."""
+    return model_name if backend == "torch" else f"{model_name}-{backend}"
+
+def _onnx_model(model_name, threads, quantized):
+    """Load the ONNX export of `model_name`, exporting (and quantizing) it
+    into MODEL_DIR the first time."""
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("The onnx backends need ONNX Runtime: pip install optimum[onnxruntime]")
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    local_dir = os.path.join(MODEL_DIR, model_name.replace('/', '--'))
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx" if quantized else "onnx/model.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        log(f"Exporting {model_name} to ONNX in {local_dir}...")
+        model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"provider": "CPUExecutionProvider"})
+        model.save(local_dir)
+        if quantized:
+            export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, local_dir)
+
+    session_options = onnxruntime.SessionOptions()
+    if threads:
+        session_options.intra_op_num_threads = threads
+    return SentenceTransformer(local_dir, backend="onnx", model_kwargs={
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": session_options
+    })
+
+def load_model(model_name, backend=EMBED_BACKEND, threads=EMBED_THREADS):
+    """Load `model_name` as a SentenceTransformer running on `backend`."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+    if backend.startswith("onnx"):
+        return _onnx_model(model_name, threads, quantized=backend == "onnx-int8")
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "torch-int8":
+        # In place, so the fp32 weights aren't kept alongside the int8 ones
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+def ranking_agreement(reference_docs, reference_queries, docs, queries, k=AGREEMENT_TOP_K):
+    """Mean share of each query's top-k documents under the reference
+    embeddings that are also in its top-k under the candidate ones."""
+    def top_k(doc_vectors, query_vectors):
+        doc_vectors = doc_vectors / np.linalg.norm(doc_vectors, axis=1, keepdims=True)
+        query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        scores = query_vectors @ doc_vectors.T
+        return np.argsort(-scores, axis=1)[:, :k]
+
+    expected = top_k(np.asarray(reference_docs), np.asarray(reference_queries))
+    actual = top_k(np.asarray(docs), np.asarray(queries))
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
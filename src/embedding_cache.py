@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+def content_hash(text):
+    """Stable hash of the text that produced an embedding."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Disk-backed embedding matrix with a content-hash index.
+
+    Vectors live in a memory-mapped ``.npy`` matrix, one row per key. The
+    JSON index maps each key to its row and the hash of the text that was
+    encoded, so only new or changed texts need to go through the model.
+    The files are named after the model, so each model keeps its own cache.
+    """
+
+    def __init__(self, directory, model_name, name="embeddings"):
+        stem = f"{name}-{model_name.replace('/', '--')}"
+        self.matrix_path = os.path.join(directory, f"{stem}.npy")
+        self.index_path = os.path.join(directory, f"{stem}_index.json")
+        self.model_name = model_name
+        self.entries = {}
+        self.free_rows = []
+        self.matrix = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("model") != self.model_name:
+                return
+            matrix = np.load(self.matrix_path, mmap_mode="r+")
+        except (FileNotFoundError, ValueError, json.JSONDecodeError):
+            return
+        self.entries = index.get("entries", {})
+        self.free_rows = index.get("free_rows", [])
+        self.matrix = matrix
+
+    def _save_index(self):
+        directory = os.path.dirname(self.index_path)
+        with tempfile.NamedTemporaryFile("w", delete=False, dir=directory, encoding="utf-8") as tf:
+            json.dump({
+                "model": self.model_name,
+                "entries": self.entries,
+                "free_rows": self.free_rows,
+            }, tf)
+        os.replace(tf.name, self.index_path)
+
+    def _ensure_capacity(self, rows, dim):
+        """Grow the on-disk matrix so it holds at least `rows` rows."""
+        if self.matrix is not None and self.matrix.shape[0] >= rows and self.matrix.shape[1] == dim:
+            return
+        capacity = max(rows, int(rows * 1.25), 64)
+        tmp_path = self.matrix_path + ".tmp"
+        grown = open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, dim))
+        if self.matrix is not None and self.matrix.shape[1] == dim:
+            grown[:self.matrix.shape[0]] = self.matrix
+        grown.flush()
+        del grown
+        self.matrix = None
+        os.replace(tmp_path, self.matrix_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode="r+")
+
+    def update(self, texts, encode):
+        """Bring the cache in line with `texts` (key -> text).
+
+        Keys whose text changed or that are not cached yet are encoded with
+        `encode(list_of_texts)`; keys that are no longer present are evicted.
+        Returns the number of texts that were encoded.
+        """
+        hashes = {key: content_hash(text) for key, text in texts.items()}
+
+        evicted = [key for key in self.entries if key not in hashes]
+        for key in evicted:
+            self.free_rows.append(self.entries.pop(key)["row"])
+
+        stale = [key for key, h in hashes.items() if self.entries.get(key, {}).get("hash") != h]
+        if not stale:
+            if evicted:
+                self._save_index()
+            return 0
+
+        vectors = np.asarray(encode([texts[key] for key in stale]), dtype=np.float32)
+
+        next_row = 1 + max((e["row"] for e in self.entries.values()), default=-1)
+        next_row = max([next_row] + [r + 1 for r in self.free_rows])
+        rows = []
+        for key in stale:
+            if key in self.entries:
+                rows.append(self.entries[key]["row"])
+            elif self.free_rows:
+                rows.append(self.free_rows.pop())
+            else:
+                rows.append(next_row)
+                next_row += 1
+
+        self._ensure_capacity(next_row, vectors.shape[1])
+        self.matrix[rows] = vectors
+        self.matrix.flush()
+
+        for key, row in zip(stale, rows):
+            self.entries[key] = {"hash": hashes[key], "row": row}
+        self._save_index()
+        return len(stale)
+
+    def get(self, keys):
+        """Return the cached vectors for `keys` as an (n, dim) array."""
+        rows = [self.entries[key]["row"] for key in keys]
+        if not rows:
+            return np.zeros((0, 0 if self.matrix is None else self.matrix.shape[1]), dtype=np.float32)
+        return np.asarray(self.matrix[rows])
@@ -0,0 +1,131 @@
+import os
+import time
+
+import numpy as np
+
+# Padded tokens per batch; long texts get small batches, short ones big batches
+TOKEN_BUDGET = int(os.environ.get('ENCODE_TOKEN_BUDGET', 8192))
+MAX_BATCH_SIZE = 256
+
+# Worker processes for encoding (1 = encode in this process)
+ENCODE_PROCESSES = int(os.environ.get('ENCODE_PROCESSES', 1))
+
+# Below this many texts a process pool costs more than it saves
+MIN_TEXTS_FOR_POOL = 2000
+
+# Overlapping word windows used when long descriptions are chunked. 160 words
+# stays under the 256 word pieces all-MiniLM-L6-v2 reads before truncating.
+CHUNK_WORDS = 160
+CHUNK_OVERLAP = 32
+
+
+def chunk_text(text, window=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split `text` into overlapping windows of `window` words."""
+    words = text.split()
+    if len(words) <= window:
+        return [text]
+    step = window - overlap
+    return [" ".join(words[i:i + window]) for i in range(0, len(words) - overlap, step)]
+
+
+def pool_chunks(vectors, mode):
+    """Pool a job's chunk vectors into one normalized vector ("mean" or "max")."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    pooled = vectors.max(axis=0) if mode == "max" else vectors.mean(axis=0)
+    return pooled / max(np.linalg.norm(pooled), 1e-12)
+
+
+class EncodingEngine:
+    """Length-bucketed, adaptively batched encoding on top of a SentenceTransformer.
+
+    Texts are sorted by token length and cut into batches that fit a padded
+    token budget, so short texts are not padded to the longest one in the
+    corpus. With `processes` > 1, large inputs are fanned out over the
+    sentence-transformers multi-process pool. Results are always returned in
+    input order, and `stats` describes the last call.
+    """
+
+    def __init__(self, model, token_budget=TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE, processes=ENCODE_PROCESSES):
+        self.model = model
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.processes = processes
+        self.pool = None
+        self.stats = {}
+
+    def token_lengths(self, texts):
+        """Token count of each text, capped at the model's max sequence length."""
+        max_length = getattr(self.model, 'max_seq_length', None) or 512
+        tokenizer = getattr(self.model, 'tokenizer', None)
+        if tokenizer is None:
+            # Rough estimate of ~4 characters per word piece
+            return [min(max_length, len(text) // 4 + 2) for text in texts]
+        encoded = tokenizer(list(texts), truncation=True, max_length=max_length)
+        return [len(ids) for ids in encoded['input_ids']]
+
+    def batches(self, lengths):
+        """Split indices, longest first, into batches within the token budget."""
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+        batches, current = [], []
+        for i in order:
+            # The first (longest) text of a batch sets its padded width
+            width = lengths[current[0]] if current else lengths[i]
+            if current and ((len(current) + 1) * width > self.token_budget or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current = []
+            current.append(i)
+        if current:
+            batches.append(current)
+        return batches
+
+    def encode(self, texts):
+        """Encode `texts` and return an (n, dim) float32 array in input order."""
+        texts = list(texts)
+        start = time.perf_counter()
+        if not texts:
+            self.stats = {"texts": 0, "tokens": 0, "batches": 0, "seconds": 0.0, "texts_per_sec": 0.0}
+            return np.zeros((0, 0), dtype=np.float32)
+
+        lengths = self.token_lengths(texts)
+        batches = self.batches(lengths)
+
+        if self.processes > 1 and len(texts) >= MIN_TEXTS_FOR_POOL:
+            embeddings = self._encode_with_pool(texts, lengths)
+        else:
+            embeddings = None
+            for batch in batches:
+                vectors = self.model.encode([texts[i] for i in batch], batch_size=len(batch), convert_to_numpy=True)
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+                embeddings[batch] = vectors
+
+        seconds = time.perf_counter() - start
+        self.stats = {
+            "texts": len(texts),
+            "tokens": sum(lengths),
+            "batches": len(batches),
+            "seconds": seconds,
+            "texts_per_sec": len(texts) / seconds if seconds else 0.0,
+        }
+        return embeddings
+
+    def _encode_with_pool(self, texts, lengths):
+        """Fan sorted texts out over worker processes, then restore input order."""
+        if self.pool is None:
+            self.pool = self.model.start_multi_process_pool(['cpu'] * self.processes)
+
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        median = lengths[order[len(order) // 2]]
+        batch_size = max(1, min(self.max_batch_size, self.token_budget // max(median, 1)))
+        vectors = self.model.encode_multi_process([texts[i] for i in order], self.pool, batch_size=batch_size)
+
+        embeddings = np.empty_like(vectors, dtype=np.float32)
+        embeddings[order] = vectors
+        return embeddings
+
+    def close(self):
+        """Stop the worker processes, if any were started."""
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
@@ -0,0 +1,65 @@
+import json
+import os
+from datetime import datetime
+from storage import JobStore
+
+# Base directory for resolving file paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def log(message):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+
+def load_json(name, default):
+    """Load one of the legacy JSON stores from static/."""
+    try:
+        with open(os.path.join(BASE_DIR, 'static', name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        log(f"{name} not found or invalid, skipping.")
+        return default
+
+def main():
+    """One-shot import of the legacy JSON files into the SQLite store."""
+    log("Starting import_json.py")
+
+    with JobStore() as store:
+        jobs = load_json('jobs.json', [])
+        store.add_jobs([
+            {
+                "url": job["url"],
+                "site": job.get("site", "unknown"),
+                "found_at": job.get("found_at"),
+                "listing_title": job.get("listing_title"),
+                "posted_at": job.get("posted_at")
+            }
+            for job in jobs if "url" in job
+        ])
+        log(f"Imported {len(jobs)} jobs.")
+
+        details = load_json('job_details.json', {})
+        store.upsert_details(details)
+        log(f"Imported {len(details)} job details.")
+
+        cleaned = load_json('jobs_for_embedding.json', {})
+        store.save_cleaned(cleaned)
+        log(f"Imported {len(cleaned)} cleaned jobs.")
+
+        matches = load_json('matching_jobs.json', [])
+        store.save_matches([
+            {
+                "url": m["url"],
+                "title": m.get("title"),
+                "score": m.get("score"),
+                "matched_at": m.get("matched_at"),
+                "is_new": int(bool(m.get("is_new", False))),
+                "status": m.get("status", "matched"),
+                "resume": m.get("resume")
+            }
+            for m in matches
+        ])
+        log(f"Imported {len(matches)} matches.")
+
+    log("Import complete. The JSON files are no longer read and can be archived.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import re
+import threading
+from bisect import bisect_left
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    """Lower-case alphanumeric tokens of `text`."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class JobIndex:
+    """Read-optimized view of jobs for the dashboard's /api/jobs listing.
+
+    Jobs are kept in display order (new jobs first, most recent additions
+    first within each group), bucketed by site, and indexed by token so a
+    search only touches the jobs that actually match. Descriptions are left
+    out (see `page_jobs`). `update` applies the rows that changed since the
+    index was built, so a scrape saving a batch at a time doesn't force a
+    full rebuild on every request.
+    """
+
+    def __init__(self, jobs, revision):
+        self.revision = revision
+        self.by_url = {}  # discovery order
+        self.job_tokens = {}
+        self.postings = {}
+        self.tokens = []
+        self._add(jobs)
+        self._arrange()
+
+    def _add(self, jobs):
+        """Insert or replace `jobs` (in discovery order) and their postings."""
+        new_tokens = []
+        for job in jobs:
+            url = job['url']
+            for token in self.job_tokens.get(url, ()):
+                self.postings[token].discard(url)
+            tokens = set(tokenize(f"{job['title']} {job['site']} {url}"))
+            for token in tokens:
+                if token not in self.postings:
+                    self.postings[token] = set()
+                    new_tokens.append(token)
+                self.postings[token].add(url)
+            self.job_tokens[url] = tokens
+            self.by_url[url] = job
+        if new_tokens:
+            self.tokens = sorted(self.tokens + new_tokens)
+
+    def _arrange(self):
+        """Recompute the display order and the per-site buckets."""
+        # Display order: unseen jobs first, newest first within each group
+        jobs = list(reversed(self.by_url.values()))
+        self.jobs = [j for j in jobs if not j['seen']] + [j for j in jobs if j['seen']]
+        self.positions = {job['url']: position for position, job in enumerate(self.jobs)}
+        self.by_site = {}
+        for position, job in enumerate(self.jobs):
+            self.by_site.setdefault(job['site'], []).append(position)
+
+    def update(self, jobs, revision):
+        """Apply the changed or new `jobs` (in discovery order) as of `revision`."""
+        self._add(jobs)
+        self._arrange()
+        self.revision = revision
+
+    def _prefix_matches(self, prefix):
+        """Positions of jobs with any token starting with `prefix`."""
+        positions = set()
+        i = bisect_left(self.tokens, prefix)
+        while i < len(self.tokens) and self.tokens[i].startswith(prefix):
+            positions.update(self.positions[url] for url in self.postings[self.tokens[i]])
+            i += 1
+        return positions
+
+    def search(self, search='', site=''):
+        """Positions matching every search term (as a token prefix) and the site."""
+        terms = tokenize(search)
+        if not terms:
+            if site:
+                return self.by_site.get(site, [])
+            return range(len(self.jobs))
+
+        # Intersect from the most selective term
+        candidates = sorted((self._prefix_matches(term) for term in terms), key=len)
+        positions = set.intersection(*candidates)
+        if site:
+            positions = {p for p in positions if self.jobs[p]['site'] == site}
+        return sorted(positions)
+
+    def page(self, page=1, per_page=20, search='', site=''):
+        """Return (jobs on the requested page, total matching jobs)."""
+        positions = self.search(search, site)
+        start = (page - 1) * per_page
+        return [self.jobs[p] for p in positions[start:start + per_page]], len(positions)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _current_index(store):
+    """The cached index, brought up to date with the jobs tables. Call with
+    `_index_lock` held."""
+    global _index
+    if _index is not None:
+        changes = store.job_changes_since(_index.revision)
+        if changes is not None:
+            urls, revision = changes
+            if urls:
+                _index.update(store.iter_jobs_with_details(urls, with_description=False), revision)
+            return _index
+    _index = JobIndex(store.iter_jobs_with_details(with_description=False), store.revision('jobs'))
+    return _index
+
+
+def page_jobs(store, page=1, per_page=20, search='', site=''):
+    """Return (jobs on the requested page, total matching jobs).
+
+    Updates change the index in place, so it is refreshed and read under
+    the lock. The index leaves descriptions out to stay small; they are
+    read for the jobs on the page only.
+    """
+    with _index_lock:
+        jobs, total = _current_index(store).page(page, per_page, search, site)
+    details = store.get_details([job['url'] for job in jobs if job['has_details']])
+    descriptions = {url: detail["description"] or '' for url, detail in details.items()}
+    return [{**job, "description": descriptions.get(job['url'], '')} for job in jobs], total
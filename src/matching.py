@@ -1,26 +1,65 @@
-import json
 import os
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import numpy as np
 from datetime import datetime
+from embedding_cache import EmbeddingCache, content_hash
+from storage import JobStore, MATCH_STAGE
+from vector_index import build_index, ChunkIndex
+from encoding import EncodingEngine, chunk_text, pool_chunks
+from embedding_backend import EMBED_BACKEND, EMBED_THREADS, load_model, model_id
+import metrics
 
 # Base directory for resolving file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Global model cache
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Vector index used for resume -> job search: "auto", "exact" or "ivf"
+INDEX_BACKEND = os.environ.get('MATCH_INDEX_BACKEND', 'auto')
+
+# Long-description chunking: "none" (one truncated embedding per job), or
+# chunk and pool with "mean", "max" or "topk" (mean of the best CHUNK_TOP_K)
+CHUNK_POOLING = os.environ.get('EMBED_CHUNK_POOLING', 'none')
+CHUNK_TOP_K = 3
+
+# Global model and encoding engine cache. The server warms the model up in a
+# background thread, so a run starting meanwhile must wait, not load it again
 _model_cache = None
+_engine_cache = None
+_model_lock = threading.Lock()
+_engine_lock = threading.Lock()
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
 
 def log(message):
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
 
 def get_model():
-    """Load the SentenceTransformer model once and cache it."""
+    """Load the SentenceTransformer model on EMBED_BACKEND once and cache it."""
     global _model_cache
     if _model_cache is None:
-        log("Loading sentence-transformers model...")
-        _model_cache = SentenceTransformer('all-MiniLM-L6-v2')
+        with _model_lock:
+            if _model_cache is None:
+                # Importing sentence-transformers pulls in torch (seconds), so it
+                # only happens once something actually needs encoding
+                log(f"Loading sentence-transformers model ({EMBED_BACKEND} backend"
+                    f"{f', {EMBED_THREADS} threads' if EMBED_THREADS else ''})...")
+                _model_cache = load_model(MODEL_NAME)
     return _model_cache
 
+def get_engine():
+    """Wrap the cached model in a length-bucketing EncodingEngine once."""
+    global _engine_cache
+    if _engine_cache is None:
+        with _engine_lock:
+            if _engine_cache is None:
+                _engine_cache = EncodingEngine(get_model())
+    return _engine_cache
+
 def load_resume():
     """Load resume text from resume.md"""
     try:
@@ -30,14 +69,22 @@ def load_resume():
         log("Error: resume.md not found.")
         return None
 
-def load_jobs():
-    """Load jobs from jobs_for_embedding.json"""
-    try:
-        with open(os.path.join(BASE_DIR, 'static/jobs_for_embedding.json'), 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        log("Error: jobs_for_embedding.json not found or invalid.")
-        return {}
+def load_resumes():
+    """Load resume.md plus any resume variants in static/resumes/*.md as {name: text}."""
+    resumes = {}
+    resume = load_resume()
+    if resume:
+        resumes['resume'] = resume
+
+    resumes_dir = os.path.join(BASE_DIR, 'static/resumes')
+    if os.path.isdir(resumes_dir):
+        for filename in sorted(os.listdir(resumes_dir)):
+            if filename.endswith('.md'):
+                with open(os.path.join(resumes_dir, filename), 'r', encoding='utf-8') as f:
+                    text = f.read()
+                if text.strip():
+                    resumes[os.path.splitext(filename)[0]] = text
+    return resumes
 
 def is_senior_role(title):
     """Check if a job title indicates a senior/lead role."""
@@ -50,37 +97,121 @@ def is_senior_role(title):
     title_lower = title.lower()
     return any(keyword in title_lower for keyword in senior_keywords)
 
-def match_jobs(threshold=0.5, top_n=100):
+def log_encoding_stats(engine, encoded, total, unit="jobs"):
+    """Log how much was encoded versus reused, and the encoding throughput."""
+    log(f"Encoded {encoded} new or changed {unit} ({total - encoded} from cache).")
+    if encoded:
+        stats = engine.stats
+        metrics.inc("encode_texts_total", stats['texts'], stage=MATCH_STAGE)
+        metrics.inc("encode_seconds_total", stats['seconds'], stage=MATCH_STAGE)
+        metrics.set_gauge("encode_texts_per_second", stats['texts_per_sec'], stage=MATCH_STAGE)
+        log(f"Encoding: {stats['texts_per_sec']:.1f} texts/sec, {stats['tokens'] / stats['seconds']:.0f} tokens/sec "
+            f"({stats['batches']} batches, {stats['seconds']:.1f}s)")
+
+def build_job_index(job_urls, job_titles, job_texts, index_backend, chunk_pooling):
+    """Encode new or changed jobs through the embedding cache and index them.
+
+    Without chunking each job is one (truncated) embedding. With chunking,
+    every job is split into overlapping windows, all chunks go through the
+    cache in one flattened batch, and the chunk vectors are pooled per job
+    ("mean"/"max") or scored by their best chunks at query time ("topk").
+    """
+    engine = get_engine()
+
+    if chunk_pooling == 'none':
+        cache = EmbeddingCache(os.path.join(BASE_DIR, 'static'), model_id(MODEL_NAME))
+        encoded = cache.update(dict(zip(job_urls, job_texts)), engine.encode)
+        log_encoding_stats(engine, encoded, len(job_urls))
+        return build_index(job_urls, cache.get(job_urls), index_backend)
+
+    chunk_texts = {}
+    job_chunks = {}
+    for url, title, text in zip(job_urls, job_titles, job_texts):
+        chunks = chunk_text(text)
+        job_chunks[url] = [f"{url}#{i}" for i in range(len(chunks))]
+        for i, (key, chunk) in enumerate(zip(job_chunks[url], chunks)):
+            # Later windows lose the title line, so repeat it for context
+            chunk_texts[key] = chunk if i == 0 else f"{title}\n\n{chunk}"
+
+    cache = EmbeddingCache(os.path.join(BASE_DIR, 'static'), model_id(MODEL_NAME), name='chunk_embeddings')
+    encoded = cache.update(chunk_texts, engine.encode)
+    log_encoding_stats(engine, encoded, len(chunk_texts), unit=f"chunks of {len(job_urls)} jobs")
+
+    if chunk_pooling == 'topk':
+        chunk_keys = list(chunk_texts)
+        owners = [key.rsplit('#', 1)[0] for key in chunk_keys]
+        return ChunkIndex(owners, cache.get(chunk_keys), CHUNK_TOP_K, index_backend)
+
+    pooled = np.stack([pool_chunks(cache.get(job_chunks[url]), chunk_pooling) for url in job_urls])
+    return build_index(job_urls, pooled, index_backend)
+
+def nothing_changed(store, settings):
+    """True if no job changed since the last run and it used the same
+    resumes and settings, so its matches still stand."""
+    if store.get_pending(MATCH_STAGE):
+        return False
+    info = store.get_stage_info(MATCH_STAGE)
+    return all(info.get(key) == value for key, value in settings.items())
+
+@metrics.instrumented(MATCH_STAGE)
+def match_jobs(threshold=0.5, top_n=100, index_backend=INDEX_BACKEND, chunk_pooling=CHUNK_POOLING):
+    """Match every resume against the job corpus.
+
+    Each resume keeps its `top_n` nearest jobs scoring at least `threshold`;
+    a job matched by several resumes keeps its best score. When nothing
+    changed since the last run its matches are returned without loading
+    the model.
+    """
+    store = JobStore()
     try:
         log("Starting matching.py")
-        model = get_model()
-        
-        resume = load_resume()
-        if not resume:
+
+        resumes = load_resumes()
+        if not resumes:
             return []
-        
-        jobs = load_jobs()
+        resume_names = list(resumes)
+        resume_hash = content_hash("\n".join(f"{name}\n{resumes[name]}" for name in resume_names))
+        settings = {
+            "resume_hash": resume_hash,
+            "threshold": threshold,
+            "top_n": top_n,
+            "model": model_id(MODEL_NAME),
+            "index_backend": index_backend,
+            "chunk_pooling": chunk_pooling
+        }
+
+        if nothing_changed(store, settings):
+            log("No jobs, resumes or settings changed since the last run; keeping its matches.")
+            return sorted(store.get_matches(with_description=False), key=lambda m: m['score'], reverse=True)
+
+        model = get_model()
+
+        jobs = store.get_cleaned()
         if not jobs:
+            log("Error: no cleaned jobs found. Run clean_job_details.py first.")
             return []
         
         # Load existing matches to preserve history
-        existing_matches = {}
-        try:
-            with open(os.path.join(BASE_DIR, 'static/matching_jobs.json'), 'r', encoding='utf-8') as f:
-                old_data = json.load(f)
-                existing_matches = {m['url']: m for m in old_data}
-        except (FileNotFoundError, json.JSONDecodeError):
-            pass
-
-        log(f"Loaded {len(jobs)} jobs for matching.")
+        existing_matches = {m['url']: m for m in store.iter_matches(with_description=False)}
+        pending = store.get_pending(MATCH_STAGE)
+
+        log(f"Loaded {len(jobs)} jobs and {len(resumes)} resumes for matching.")
         
-        # Create resume embedding
-        log("Creating resume embedding...")
-        resume_embedding = model.encode([resume])[0]
+        # Create resume embeddings in one batch
+        log("Creating resume embeddings...")
+        resume_embeddings = model.encode([resumes[name] for name in resume_names])
         
+        # Near-duplicates are only embedded and matched once, via their canonical posting
+        duplicates = store.get_duplicates()
+        alternates = {}
+        for url, canonical in duplicates.items():
+            alternates.setdefault(canonical, []).append(url)
+
         # Prepare job data excluding senior roles
         job_urls, job_texts, job_titles = [], [], []
         for url, job in jobs.items():
+            if url in duplicates:
+                continue
             title = job.get('title', 'Untitled')
             # if is_senior_role(title):
             #     continue
@@ -88,49 +219,64 @@ def match_jobs(threshold=0.5, top_n=100):
             job_texts.append(job.get('cleaned_text', ''))
             job_titles.append(title)
         
-        log(f"Processing {len(job_urls)} jobs.")
-        
-        # Batch encode job descriptions
-        job_embeddings = model.encode(job_texts, show_progress_bar=True)
+        log(f"Processing {len(job_urls)} jobs ({len(duplicates)} duplicates skipped).")
+        metrics.inc("stage_items_total", len(job_urls), stage=MATCH_STAGE)
         
-        # Calculate cosine similarity
-        similarities = cosine_similarity([resume_embedding], job_embeddings)[0]
+        # Encode only new or changed descriptions, reuse the rest from disk
+        index = build_job_index(job_urls, job_titles, job_texts, index_backend, chunk_pooling)
+
+        # Batched top-k search for all resumes at once
+        results = index.search(resume_embeddings, top_n)
+
+        best = {}
+        for name, hits in zip(resume_names, results):
+            for url, score in hits:
+                if score >= threshold and score > best.get(url, (-1.0, None))[0]:
+                    best[url] = (score, name)
         
         now = datetime.now().isoformat()
         matches = []
 
         # Create matches with scores
-        for i, (url, title, score) in enumerate(zip(job_urls, job_titles, similarities)):
-            if score >= threshold:
-                is_new = url not in existing_matches
-                matched_at = existing_matches[url].get('matched_at', now) if not is_new else now
-                status = existing_matches[url].get('status', 'matched') if not is_new else 'matched'
-                
-                matches.append({
-                    "url": url,
-                    "title": title,
-                    "score": float(score),
-                    "description": job_texts[i],
-                    "matched_at": matched_at,
-                    "is_new": is_new,
-                    "status": status
-                })
+        for url, title in zip(job_urls, job_titles):
+            if url not in best:
+                continue
+            score, resume_name = best[url]
+            is_new = url not in existing_matches
+            matched_at = existing_matches[url].get('matched_at', now) if not is_new else now
+            status = existing_matches[url].get('status', 'matched') if not is_new else 'matched'
+            
+            matches.append({
+                "url": url,
+                "title": title,
+                "score": score,
+                "matched_at": matched_at,
+                "is_new": is_new,
+                "status": status,
+                "resume": resume_name,
+                "alternate_urls": alternates.get(url, [])
+            })
         
-        log(f"Found {len(matches)} matching jobs above threshold {threshold}")
+        log(f"Found {len(matches)} matching jobs above threshold {threshold} (top {top_n} per resume)")
         
-        # Save results
-        with open(os.path.join(BASE_DIR, 'static/matching_jobs.json'), 'w', encoding='utf-8') as f:
-            json.dump(matches, f, indent=2, ensure_ascii=False)
-        
-        log(f"Saved matching jobs to matching_jobs.json")
+        # Save results: upsert this run's matches, drop the ones that fell out
+        store.save_matches(matches, existing_matches.keys() - best.keys())
+        store.complete_stage(MATCH_STAGE, pending, **settings)
+
+        log(f"Saved matching jobs to the database")
+        matches.sort(key=lambda m: m['score'], reverse=True)
         return matches
 
     except Exception as e:
         log(f"Critical error in matching.py: {e}")
         return []
+    finally:
+        store.close()
 
 if __name__ == "__main__":
     matches = match_jobs()
+    if _engine_cache is not None:
+        _engine_cache.close()
     print("\nTop 10 Matches:")
     for i, match in enumerate(matches[:10], 1):
         print(f"{i}. [{match['score']:.3f}] {match['title']}")
@@ -0,0 +1,291 @@
+import asyncio
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Base directory for resolving file paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_DIR = os.path.join(BASE_DIR, 'static/profiles')
+
+# Stages to profile, comma-separated ("scrape_details,matching") or "all",
+# with PROFILER=cprofile (.prof, open with snakeviz/pstats) or pyinstrument (.html)
+PROFILE_STAGES = {name.strip() for name in os.environ.get('PROFILE_STAGES', '').split(',') if name.strip()}
+PROFILER = os.environ.get('PROFILER', 'cprofile')
+
+PREFIX = 'jobagent_'
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# name: (type, help) for everything exported
+METRICS = {
+    "page_load_seconds": ("histogram", "Time to load a page until its content selector appears"),
+    "extract_seconds": ("histogram", "Time to extract items or details from a loaded page"),
+    "requests_total": ("counter", "Pages scraped, by outcome (ok, empty, error, timeout, throttled)"),
+    "stage_items_total": ("counter", "Items produced by a stage (new URLs, details, cleaned or matched jobs)"),
+    "stage_runs_total": ("counter", "Completed stage runs"),
+    "stage_seconds": ("gauge", "Duration of the stage's last run"),
+    "stage_items_per_second": ("gauge", "Throughput of the stage's last run"),
+    "stage_peak_rss_bytes": ("gauge", "Peak resident memory of the process when the stage's last run ended"),
+    "encode_texts_total": ("counter", "Texts encoded by the embedding model"),
+    "encode_seconds_total": ("counter", "Time spent encoding texts"),
+    "encode_texts_per_second": ("gauge", "Encoding throughput of the last encoding call"),
+    "peak_rss_bytes": ("gauge", "Peak resident memory of this process"),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+# (name, labels): [count per bucket..., count above the last bucket, sum]
+_histograms = {}
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
+def log(message):
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    with _lock:
+        counts = _histograms.setdefault(_key(name, labels), [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[len(LATENCY_BUCKETS)] += 1
+        counts[-1] += value
+
+@contextmanager
+def timer(name, **labels):
+    """Observe how long the block takes in the `name` histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def peak_rss():
+    """Peak resident memory of this process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def snapshot(stage=None):
+    """Every series as JSON-friendly lists, optionally only one stage's."""
+    def wanted(labels):
+        return stage is None or dict(labels).get("stage") == stage
+
+    with _lock:
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in _counters.items() if wanted(labels)],
+            "gauges": [[name, dict(labels), value] for (name, labels), value in _gauges.items() if wanted(labels)],
+            "histograms": [[name, dict(labels), list(counts)] for (name, labels), counts in _histograms.items() if wanted(labels)]
+        }
+
+def difference(after, before):
+    """The counters and histograms added between two snapshots (gauges as in `after`)."""
+    def index(series):
+        return {_key(name, labels): value for name, labels, value in series}
+
+    counters = index(before["counters"])
+    histograms = index(before["histograms"])
+    return {
+        "counters": [
+            [name, labels, value - counters.get(_key(name, labels), 0)]
+            for name, labels, value in after["counters"]
+            if value != counters.get(_key(name, labels), 0)
+        ],
+        "gauges": after["gauges"],
+        "histograms": [
+            [name, labels, [a - b for a, b in zip(counts, histograms.get(_key(name, labels), [0] * len(counts)))]]
+            for name, labels, counts in after["histograms"]
+            if counts != histograms.get(_key(name, labels))
+        ]
+    }
+
+def merge(metrics):
+    """Add a snapshot recorded by another process (a stage run as a script)."""
+    for name, labels, value in metrics.get("counters", []):
+        inc(name, value, **labels)
+    for name, labels, value in metrics.get("gauges", []):
+        set_gauge(name, value, **labels)
+    with _lock:
+        for name, labels, counts in metrics.get("histograms", []):
+            current = _histograms.setdefault(_key(name, labels), [0] * len(counts))
+            _histograms[_key(name, labels)] = [a + b for a, b in zip(current, counts)]
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    rss = peak_rss()
+    if rss is not None:
+        set_gauge("peak_rss_bytes", rss)
+
+    with _lock:
+        series = {}
+        for (name, labels), value in list(_counters.items()) + list(_gauges.items()):
+            series.setdefault(name, []).append(f"{PREFIX}{name}{_labels(labels)} {_value(value)}")
+        for (name, labels), counts in _histograms.items():
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, counts):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', f'{bound:g}')])} {cumulative}")
+            cumulative += counts[len(LATENCY_BUCKETS)]
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_value(counts[-1])}")
+            lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+
+    output = []
+    for name in sorted(series):
+        kind, description = METRICS.get(name, ("untyped", name))
+        output.append(f"# HELP {PREFIX}{name} {description}")
+        output.append(f"# TYPE {PREFIX}{name} {kind}")
+        output.extend(series[name])
+    return "\n".join(output) + "\n"
+
+def rates(metrics):
+    """Per-site success and empty-result rates from a run's request counts."""
+    totals = {}
+    for name, labels, value in metrics.get("counters", []):
+        if name == "requests_total":
+            site = totals.setdefault(labels.get("site", ""), {})
+            site[labels["outcome"]] = site.get(labels["outcome"], 0) + value
+    return {
+        site: {
+            "requests": sum(outcomes.values()),
+            "success_rate": outcomes.get("ok", 0) / sum(outcomes.values()),
+            "empty_rate": outcomes.get("empty", 0) / sum(outcomes.values())
+        }
+        for site, outcomes in totals.items() if sum(outcomes.values())
+    }
+
+def _start_profiler(stage):
+    if stage not in PROFILE_STAGES and 'all' not in PROFILE_STAGES:
+        return None
+    if PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler(async_mode='enabled')
+            profiler.start()
+            return profiler
+        except ImportError:
+            log("pyinstrument is not installed, profiling with cProfile instead.")
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Overlapping stages on one thread can't each have a cProfile
+        log(f"Not profiling {stage}: {e}")
+        return None
+    return profiler
+
+def _save_profile(stage, profiler):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{stage}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path += ".prof"
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path += ".html"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(profiler.output_html())
+    log(f"Saved {stage} profile to {path}")
+
+@contextmanager
+def stage_run(stage):
+    """Time a stage run, profile it if asked to, and persist what it recorded.
+
+    The stage counts its output with `inc("stage_items_total", n, stage=...)`;
+    everything labelled with this stage during the run is saved to the
+    run_metrics table when it ends.
+    """
+    from storage import JobStore
+
+    before = snapshot(stage)
+    started_at = datetime.now().isoformat()
+    start = time.perf_counter()
+    profiler = _start_profiler(stage)
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            _save_profile(stage, profiler)
+        seconds = time.perf_counter() - start
+        items = sum(
+            value for name, labels, value in difference(snapshot(stage), before)["counters"]
+            if name == "stage_items_total"
+        )
+        inc("stage_runs_total", stage=stage)
+        set_gauge("stage_seconds", seconds, stage=stage)
+        set_gauge("stage_items_per_second", items / seconds if seconds else 0.0, stage=stage)
+        rss = peak_rss()
+        if rss is not None:
+            set_gauge("stage_peak_rss_bytes", rss, stage=stage)
+
+        run = difference(snapshot(stage), before)
+        run["rates"] = rates(run)
+        try:
+            with JobStore() as store:
+                store.save_run_metrics(stage, started_at, seconds, run)
+        except Exception as e:
+            log(f"Could not save metrics for {stage}: {e}")
+
+def instrumented(stage):
+    """Decorator running a stage's entry point (sync or async) in `stage_run`."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def run_async(*args, **kwargs):
+                with stage_run(stage):
+                    return await func(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            with stage_run(stage):
+                return func(*args, **kwargs)
+        return run
+    return decorate
@@ -0,0 +1,147 @@
+import asyncio
+import time
+from datetime import datetime
+
+import clean_job_details
+import dedup
+import matching
+import scrape_details
+import scrape_urls
+import metrics
+from storage import JobStore, CLEAN_STAGE, DEDUP_STAGE, MATCH_STAGE
+
+# Stage name under which each run's timings are recorded
+PIPELINE_STAGE = 'pipeline'
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
+def log(message):
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
+
+
+class StageTimes:
+    """Wall-clock window and item count of each stage of one run.
+
+    `on_change` is called with the names of the running stages whenever a
+    stage starts or finishes.
+    """
+
+    def __init__(self, on_change=None):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.on_change = on_change
+
+    def _now(self):
+        return time.perf_counter() - self.started
+
+    def start(self, name):
+        # A stage that runs again (e.g. cleaning's final pass) extends its window
+        self.stages.setdefault(name, {"start": self._now(), "end": None, "items": 0})["end"] = None
+        self._changed()
+
+    def count(self, name, items):
+        self.stages[name]["items"] += items
+
+    def finish(self, name):
+        self.stages[name]["end"] = self._now()
+        self._changed()
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change([name for name, stage in self.stages.items() if stage["end"] is None])
+
+    def report(self):
+        """Log each stage's window and return the timings for storage."""
+        total = self._now()
+        summed = 0.0
+        for name, stage in self.stages.items():
+            seconds = (stage["end"] or total) - stage["start"]
+            summed += seconds
+            log(f"{name:<20} {stage['start']:7.1f}s -> {stage['end'] or total:7.1f}s "
+                f"({seconds:.1f}s, {stage['items']} items)")
+        log(f"Pipeline took {total:.1f}s end to end; the stages add up to {summed:.1f}s.")
+        return {"total_seconds": total, "stages": self.stages}
+
+
+async def clean_as_scraped(details, times):
+    """Clean each batch of new or edited details as soon as it is saved.
+
+    The batches are small, so they are cleaned in a thread rather than
+    shipped to worker processes; only the final catch-up pass in
+    `clean_job_details.main` uses a pool, and only for big runs.
+    """
+    with JobStore() as store:
+        while True:
+            batch = await details.get()
+            if batch is None:
+                break
+            items = [
+                (url, detail) for url, detail in batch.items()
+                if detail.get("changed") and not detail.get("expired_at")
+            ]
+            if not items:
+                continue
+            cleaned = dict(await asyncio.to_thread(clean_job_details.process_chunk, items))
+            store.save_cleaned(cleaned)
+            store.mark_changed(DEDUP_STAGE, cleaned)
+            store.mark_changed(MATCH_STAGE, cleaned)
+            store.clear_pending(CLEAN_STAGE, cleaned)
+            times.count("clean_job_details", len(cleaned))
+            metrics.inc("stage_items_total", len(cleaned), stage=CLEAN_STAGE)
+
+
+@metrics.instrumented(PIPELINE_STAGE)
+async def run_pipeline(on_stage=None):
+    """Scrape, clean, dedup and match in one process.
+
+    URL discovery, detail scraping and cleaning run concurrently, connected
+    by queues: details of a site's new URLs are scraped as soon as the
+    listing page is saved, and cleaned as soon as each batch of details is.
+    Dedup and matching need the whole corpus, so they run once the streaming
+    stages finish; both only process what changed. `on_stage` is called
+    with the names of the running stages as they change.
+    """
+    times = StageTimes(on_stage)
+    new_jobs = asyncio.Queue()
+    details = asyncio.Queue()
+
+    def jobs_saved(jobs):
+        new_jobs.put_nowait(jobs)
+        times.count("scrape_urls", len(jobs))
+
+    def details_saved(batch):
+        details.put_nowait(batch)
+        times.count("scrape_details", len(batch))
+
+    async def stage(name, run, done_queue=None):
+        times.start(name)
+        try:
+            await run
+        finally:
+            if done_queue is not None:
+                done_queue.put_nowait(None)
+            times.finish(name)
+
+    await asyncio.gather(
+        stage("scrape_urls", scrape_urls.scrape_urls(on_saved=jobs_saved), new_jobs),
+        stage("scrape_details", scrape_details.scrape_details(new_jobs, details_saved), details),
+        stage("clean_job_details", clean_as_scraped(details, times))
+    )
+
+    # Expired and removed postings, plus anything left over from earlier runs
+    await stage("clean_job_details", asyncio.to_thread(clean_job_details.main))
+    await stage("dedup", asyncio.to_thread(dedup.main))
+    await stage("matching", asyncio.to_thread(matching.match_jobs))
+
+    timings = times.report()
+    with JobStore() as store:
+        store.complete_stage(PIPELINE_STAGE, [], **timings)
+    return timings
+
+
+if __name__ == "__main__":
+    asyncio.run(run_pipeline())
@@ -0,0 +1,182 @@
+import asyncio
+import time
+from collections import deque
+
+# Outcomes reported back to the scheduler after each request
+OK = "ok"
+EMPTY = "empty"
+ERROR = "error"
+TIMEOUT = "timeout"
+THROTTLED = "throttled"
+
+# Adaptive backoff after a timeout or a 429 (seconds)
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+# A throttled or timed-out item is put back this many times before giving up
+MAX_RETRIES = 1
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts up to `burst`."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class SiteLimiter:
+    """Concurrency cap and request rate for one site.
+
+    The effective concurrency follows AIMD: it is halved (and the site paused
+    with exponential backoff) on a timeout or 429, and grows back by one per
+    successful request up to the configured maximum.
+    """
+
+    def __init__(self, name, max_concurrency=4, rate=None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.active = 0
+        self.bucket = TokenBucket(rate) if rate else None
+        self.backoff = 0.0
+        self.blocked_until = 0.0
+
+    def wait_time(self, now):
+        """Seconds until a request may start, or None if all slots are busy."""
+        if self.active >= self.limit:
+            return None
+        wait = max(0.0, self.blocked_until - now)
+        if self.bucket:
+            wait = max(wait, self.bucket.wait_time(now))
+        return wait
+
+    def start(self):
+        self.active += 1
+        if self.bucket:
+            self.bucket.take()
+
+    def finish(self, outcome):
+        self.active -= 1
+        if outcome in (TIMEOUT, THROTTLED):
+            self.limit = max(1, self.limit // 2)
+            self.backoff = min(BACKOFF_MAX, self.backoff * 2 if self.backoff else BACKOFF_BASE)
+            self.blocked_until = time.monotonic() + self.backoff
+        elif outcome == OK:
+            self.limit = min(self.max_concurrency, self.limit + 1)
+            self.backoff = 0.0
+
+    async def pace(self):
+        """Wait for a rate token for a follow-up request made while already
+        holding a slot, such as the next page of the same listing."""
+        while self.bucket:
+            wait = self.bucket.wait_time(time.monotonic())
+            if wait == 0:
+                self.bucket.take()
+                return
+            await asyncio.sleep(wait)
+
+
+def limiters_from_config(configs, default_concurrency=4, default_rate=None):
+    """Build {site: SiteLimiter} from per-site config dicts.
+
+    Each config may set "max_concurrency" and "rate" (requests per second).
+    """
+    return {
+        name: SiteLimiter(
+            name,
+            config.get("max_concurrency", default_concurrency),
+            config.get("rate", default_rate)
+        )
+        for name, config in configs.items()
+    }
+
+
+class SiteScheduler:
+    """Per-site work queues shared by a pool of generic workers.
+
+    A worker asks for the next item and gets one from whichever site has a
+    free slot and a rate token, rotating between sites, so a slow or
+    throttled site never holds workers that other sites could use.
+
+    With `closed=False` the scheduler accepts items while workers run (fed
+    by another stage); workers then only finish once `close()` is called.
+    `key` maps an item to a stable identifier (the item itself by default)
+    that its retries are counted under.
+    """
+
+    def __init__(self, limiters, closed=True, key=None):
+        self.limiters = limiters
+        self.queues = {name: deque() for name in limiters}
+        self.key = key or (lambda item: item)
+        self.retries = {}
+        self.rotation = 0
+        self.closed = closed
+        self.changed = asyncio.Event()
+
+    def add_site(self, site, limiter):
+        """Register a site with its own limiter before adding its items."""
+        if site not in self.limiters:
+            self.limiters[site] = limiter
+            self.queues[site] = deque()
+
+    def add(self, site, item):
+        if site not in self.limiters:
+            self.add_site(site, SiteLimiter(site))
+        self.queues[site].append(item)
+        self.changed.set()
+
+    def close(self):
+        """No more items will be added; workers stop once the queues drain."""
+        self.closed = True
+        self.changed.set()
+
+    async def next(self):
+        """Return (site, item) for the next ready item, or None when all work is done."""
+        while True:
+            now = time.monotonic()
+            names = list(self.queues)
+            soonest = None
+            for offset in range(len(names)):
+                name = names[(self.rotation + offset) % len(names)]
+                if not self.queues[name]:
+                    continue
+                wait = self.limiters[name].wait_time(now)
+                if wait == 0:
+                    self.limiters[name].start()
+                    self.rotation = (self.rotation + offset + 1) % len(names)
+                    return name, self.queues[name].popleft()
+                if wait is not None:
+                    soonest = wait if soonest is None else min(soonest, wait)
+
+            in_flight = any(limiter.active for limiter in self.limiters.values())
+            if self.closed and not in_flight and not any(self.queues.values()):
+                return None
+
+            # Sleep until a slot frees up, an item is added or a site is ready
+            self.changed.clear()
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=soonest)
+            except asyncio.TimeoutError:
+                pass
+
+    def done(self, site, item, outcome):
+        """Report how an item went; throttled or timed-out items are retried once."""
+        self.limiters[site].finish(outcome)
+        if outcome in (TIMEOUT, THROTTLED):
+            key = (site, self.key(item))
+            if self.retries.get(key, 0) < MAX_RETRIES:
+                self.retries[key] = self.retries.get(key, 0) + 1
+                self.queues[site].append(item)
+        self.changed.set()
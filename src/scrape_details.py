@@ -1,8 +1,15 @@
 import json
 import os
 import asyncio
-from datetime import datetime
-from playwright.async_api import async_playwright
+import hashlib
+import time
+from datetime import datetime, timedelta
+import httpx
+from bs4 import BeautifulSoup, Comment, NavigableString
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from scheduler import SiteScheduler, SiteLimiter, limiters_from_config, OK, EMPTY, ERROR, TIMEOUT, THROTTLED
+from storage import JobStore, BatchWriter, CLEAN_STAGE
+import metrics
 
 # Base directory for resolving file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -20,82 +27,382 @@ SITE_NAME_MAP = {
     "WWR": "WWR"
 }
 
+# Concurrent tabs reused across detail pages (shared by all sites; per-site
+# caps come from "max_concurrency"/"rate" in the scraping map)
+PAGE_POOL_SIZE = 10
+
+# Sites with "fetch_mode": "http" are fetched without a browser, so many more
+# of them can be in flight than there are tabs
+HTTP_CONCURRENCY = 40
+HTTP_TIMEOUT = 30
+WORKER_COUNT = PAGE_POOL_SIZE + HTTP_CONCURRENCY
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+
+# Elements whose text starts on a new line, like the browser's innerText
+BLOCK_TAGS = {
+    "p", "div", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "header", "footer", "tr", "table", "blockquote", "pre"
+}
+
+# HTTP statuses that mean a site wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# How long to wait for a site's description selector (ms), unless the
+# scraping map sets a per-site "timeout"
+DEFAULT_SELECTOR_TIMEOUT = 10000
+
+# Scraped details older than this are re-checked, unless the scraping map
+# sets a per-site "max_age_hours" (0 = never refresh)
+DEFAULT_MAX_AGE_HOURS = float(os.environ.get('DETAILS_MAX_AGE_HOURS', 72))
+
+# A refresh that comes back empty this many times in a row (typically a
+# removed posting redirecting to a page without the selectors) expires it
+MAX_EMPTY_REFRESHES = 3
+
+# Stale details re-checked per run, oldest check first, so the archive is
+# refreshed a slice at a time rather than all at once every max age
+MAX_REFRESHES_PER_RUN = int(os.environ.get('DETAILS_MAX_REFRESHES', 200))
+
+# Statuses meaning the posting was taken down
+GONE_STATUSES = (404, 410)
+
+# Refresh results, reported to the scheduler as OK
+NOT_MODIFIED = "not_modified"
+EXPIRED = "expired"
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
 def log(message):
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
 
-async def scrape_single_job(context, job, scraping_map, job_details, lock, sem):
-    async with sem:
-        url = job.get('url')
-        site_name = job.get('site')
-        
-        if not url or not site_name:
-            return
+def detail_hash(title, description):
+    """Fingerprint of a page's extracted content, to tell edits from re-renders."""
+    return hashlib.sha1(f"{title}\n{description}".encode("utf-8")).hexdigest()
 
-        config_key = SITE_NAME_MAP.get(site_name, site_name)
-        if config_key not in scraping_map:
-            # log(f"Skipping {site_name}: No scraping config found.")
-            return
+def needs_refresh(state, max_age_hours, now):
+    """Whether a stored detail is due for a re-check."""
+    if not max_age_hours:
+        return False
+    if not state["checked_at"]:
+        return True
+    return datetime.fromisoformat(state["checked_at"]) < now - timedelta(hours=max_age_hours)
 
-        selectors = scraping_map[config_key]
-        
-        # log(f"Scraping details for {url} ({site_name})...")
-        
-        page = None
+def _collect_text(element, parts, preformatted=False):
+    for node in element.children:
+        if isinstance(node, NavigableString):
+            if not isinstance(node, Comment):
+                # Line breaks in the HTML source are just whitespace, except in <pre>
+                parts.append(str(node) if preformatted else " ".join(str(node).split("\n")))
+        elif node.name == "br":
+            parts.append("\n")
+        elif node.name not in ("script", "style", "noscript", "template"):
+            block = node.name in BLOCK_TAGS
+            if block:
+                parts.append("\n")
+            _collect_text(node, parts, preformatted or node.name == "pre")
+            if block:
+                parts.append("\n")
+
+def element_text(element):
+    """Approximate a browser's innerText for a parsed HTML element."""
+    parts = []
+    _collect_text(element, parts)
+    lines = (" ".join(line.split()) for line in "".join(parts).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+class PagePool:
+    """Long-lived browser tabs handed out one job at a time.
+
+    Chromium is only launched when the first job actually needs a browser,
+    so runs where every site is served over plain HTTP never start it.
+    """
+
+    def __init__(self, playwright, size):
+        self.playwright = playwright
+        self.size = size
+        self.created = 0
+        self.idle = asyncio.Queue()
+        self.browser = None
+        self.context = None
+        self.start_lock = asyncio.Lock()
+
+    async def _start(self):
+        async with self.start_lock:
+            if self.context is not None:
+                return
+            self.browser = await self.playwright.chromium.launch(
+                headless=True,
+                args=['--disable-blink-features=AutomationControlled']
+            )
+            self.context = await self.browser.new_context(
+                user_agent=USER_AGENT,
+                ignore_https_errors=True
+            )
+            
+            await self.context.route("**/*", lambda route: route.abort() if route.request.resource_type in ["image", "media", "font"] else route.continue_())
+
+    async def acquire(self):
+        await self._start()
+        if self.idle.empty() and self.created < self.size:
+            self.created += 1
+            return await self.context.new_page()
+        page = await self.idle.get()
+        # Replace the tab if a previous job crashed or closed it
+        if page.is_closed():
+            page = await self.context.new_page()
+        return page
+
+    def release(self, page):
+        self.idle.put_nowait(page)
+
+    async def close(self):
+        if self.context is not None:
+            await self.context.close()
+            await self.browser.close()
+
+def response_validators(headers):
+    """Cache validators a server sent for a page."""
+    return {"etag": headers.get("etag"), "last_modified": headers.get("last-modified")}
+
+async def fetch_with_http(client, url, selectors, previous=None, site=""):
+    """Fetch a server-rendered page and apply the CSS selectors to its HTML.
+
+    With the `previous` validators of a stored page, the request is
+    conditional and an unchanged page comes back as NOT_MODIFIED.
+    Returns (outcome, title, description, validators).
+    """
+    headers = {}
+    if previous:
+        if previous.get("etag"):
+            headers["If-None-Match"] = previous["etag"]
+        if previous.get("last_modified"):
+            headers["If-Modified-Since"] = previous["last_modified"]
+
+    with metrics.timer("page_load_seconds", stage="scrape_details", site=site):
+        response = await client.get(url, headers=headers)
+    validators = response_validators(response.headers)
+    if response.status_code == 304:
+        return NOT_MODIFIED, "", "", validators
+    if response.status_code in THROTTLE_STATUSES:
+        return THROTTLED, "", "", validators
+    if response.status_code in GONE_STATUSES:
+        return EXPIRED, "", "", validators
+    response.raise_for_status()
+
+    with metrics.timer("extract_seconds", stage="scrape_details", site=site):
+        soup = BeautifulSoup(response.text, "html.parser")
+        if selectors.get('expired') and soup.select_one(selectors['expired']):
+            return EXPIRED, "", "", validators
+        title_el = soup.select_one(selectors['title'])
+        description_el = soup.select_one(selectors['description'])
+        title = element_text(title_el) if title_el else ""
+        description = element_text(description_el) if description_el else ""
+    return (OK if title or description else EMPTY), title, description, validators
+
+async def fetch_with_browser(page, url, selectors, config_key, site=""):
+    """Render the page in Chromium and read the selectors' inner text.
+    Returns (outcome, title, description, validators)."""
+    timeout = selectors.get('timeout', DEFAULT_SELECTOR_TIMEOUT)
+
+    load_start = time.perf_counter()
+    response = await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+    validators = response_validators(response.headers) if response is not None else {}
+    if response is not None and response.status in THROTTLE_STATUSES:
+        return THROTTLED, "", "", validators
+    if response is not None and response.status in GONE_STATUSES:
+        return EXPIRED, "", "", validators
+
+    # Ready as soon as the description renders, not after a fixed sleep
+    try:
+        await page.wait_for_selector(selectors['description'], timeout=timeout)
+    except Exception:
+        pass
+
+    # Special handling for MeetFrank
+    if config_key == 'meetfrank':
+        try:
+            read_more_btn = page.locator('text="Read more"').first
+            if await read_more_btn.is_visible():
+                await read_more_btn.click()
+                await read_more_btn.wait_for(state="hidden", timeout=timeout)
+        except Exception:
+            pass
+    extract_start = time.perf_counter()
+    metrics.observe("page_load_seconds", extract_start - load_start, stage="scrape_details", site=site)
+
+    if selectors.get('expired'):
         try:
-            page = await context.new_page()
+            if await page.locator(selectors['expired']).count() > 0:
+                return EXPIRED, "", "", validators
+        except Exception:
+            pass
+
+    # Extract Data
+    title = ""
+    description = ""
+
+    try:
+        if await page.locator(selectors['title']).count() > 0:
+            title = (await page.locator(selectors['title']).first.inner_text()).strip()
+    except Exception:
+        pass
+
+    try:
+        if await page.locator(selectors['description']).count() > 0:
+            description = (await page.locator(selectors['description']).first.inner_text()).strip()
+    except Exception:
+        pass
+
+    metrics.observe("extract_seconds", time.perf_counter() - extract_start, stage="scrape_details", site=site)
+    return (OK if title or description else EMPTY), title, description, validators
+
+async def scrape_single_job(job, scraping_map, writer, pages, client, previous=None):
+    """Scrape one detail page and hand the result to `writer`. `previous`
+    holds the stored validators when this is a refresh of an already-scraped
+    page."""
+    url = job.get('url')
+    site_name = job.get('site')
+    
+    if not url or not site_name:
+        return ERROR
+
+    config_key = SITE_NAME_MAP.get(site_name, site_name)
+    if config_key not in scraping_map:
+        # log(f"Skipping {site_name}: No scraping config found.")
+        return ERROR
+
+    selectors = scraping_map[config_key]
+    
+    # log(f"Scraping details for {url} ({site_name})...")
+    
+    try:
+        outcome = EMPTY
+        # Server-rendered sites: plain HTTP first, browser only if that comes back empty
+        if selectors.get('fetch_mode', 'browser') == 'http':
             try:
-                await page.goto(url, timeout=60000)
-                await page.wait_for_timeout(2000)
+                outcome, title, description, validators = await fetch_with_http(client, url, selectors, previous, site_name)
+            except httpx.TimeoutException as e:
+                log(f"HTTP fetch timed out for {url}, falling back to browser: {e}")
+            except httpx.HTTPError as e:
+                log(f"HTTP fetch failed for {url}, falling back to browser: {e}")
 
-                # Special handling for MeetFrank
-                if config_key == 'meetfrank':
-                    try:
-                        read_more_btn = page.locator('text="Read more"').first
-                        if await read_more_btn.is_visible(timeout=3000):
-                            await read_more_btn.click()
-                            await page.wait_for_timeout(1000)
-                    except Exception:
-                        pass
-
-                # Extract Data
-                title = ""
-                description = ""
-
-                try:
-                    if await page.locator(selectors['title']).count() > 0:
-                        title = (await page.locator(selectors['title']).first.inner_text()).strip()
-                except Exception:
-                    pass
-
-                try:
-                    if await page.locator(selectors['description']).count() > 0:
-                        description = (await page.locator(selectors['description']).first.inner_text()).strip()
-                except Exception:
-                    pass
-
-                if title or description:
-                    async with lock:
-                        job_details[url] = {
-                            "title": title,
-                            "description": description,
-                            "scraped_at": datetime.now().isoformat(),
-                            "seen": True,
-                            "last_seen": datetime.now().isoformat()
-                        }
-                    log(f"Scraped: {title[:50]}..." if title else f"Scraped: {url}")
-                else:
-                    log(f"Empty result for {url}")
-
-            except Exception as e:
-                log(f"Failed to scrape {url}: {e}")
+        if outcome == EMPTY:
+            page = await pages.acquire()
+            try:
+                outcome, title, description, validators = await fetch_with_browser(page, url, selectors, config_key, site_name)
             finally:
-                if page:
-                    await page.close()
+                pages.release(page)
+
+        if outcome == THROTTLED:
+            log(f"Throttled on {url}")
+            return THROTTLED
+
+        now = datetime.now().isoformat()
+        if outcome == EXPIRED:
+            writer.add(url, {"seen": False, "checked_at": now, "expired_at": now, "changed": True})
+            log(f"Expired: {url}")
+            return OK
+
+        if outcome == OK:
+            content_hash = detail_hash(title, description)
+            if previous and content_hash == previous.get("content_hash"):
+                outcome = NOT_MODIFIED
+            else:
+                writer.add(url, {
+                    "title": title,
+                    "description": description,
+                    "scraped_at": now,
+                    "seen": True,
+                    "last_seen": now,
+                    "content_hash": content_hash,
+                    "checked_at": now,
+                    **validators,
+                    "changed": True
+                })
+                log(f"Scraped: {title[:50]}..." if title else f"Scraped: {url}")
+                return OK
 
-        except Exception as e:
-             log(f"Error creating page for {url}: {e}")
+        if outcome == NOT_MODIFIED:
+            # Same content as last time: only the check time and validators move
+            writer.add(url, {
+                "seen": True,
+                "last_seen": now,
+                "checked_at": now,
+                "etag": validators.get("etag") or previous.get("etag"),
+                "last_modified": validators.get("last_modified") or previous.get("last_modified")
+            })
+            return OK
+        else:
+            if previous:
+                # Record the check, so the page waits for its next max age
+                empty_refreshes = previous.get("empty_refreshes", 0) + 1
+                if empty_refreshes >= MAX_EMPTY_REFRESHES:
+                    writer.add(url, {"seen": False, "checked_at": now, "expired_at": now, "changed": True})
+                    log(f"Expired after {empty_refreshes} empty refreshes: {url}")
+                    return EMPTY
+                writer.add(url, {
+                    "seen": True,
+                    "checked_at": now,
+                    "empty_refreshes": empty_refreshes,
+                    "etag": previous.get("etag"),
+                    "last_modified": previous.get("last_modified")
+                })
+            log(f"Empty result for {url}")
+            return EMPTY
 
-async def scrape_details():
+    except PlaywrightTimeoutError as e:
+        log(f"Timed out scraping {url}: {e}")
+        return TIMEOUT
+    except Exception as e:
+        log(f"Failed to scrape {url}: {e}")
+        return ERROR
+
+async def job_worker(scheduler, scraping_map, writer, pages, client, refresh):
+    """Scrape whichever site's job is ready next until none are left."""
+    while True:
+        task = await scheduler.next()
+        if task is None:
+            break
+        site, job = task
+        outcome = ERROR
+        try:
+            outcome = await scrape_single_job(job, scraping_map, writer, pages, client, refresh.get(job['url']))
+        finally:
+            scheduler.done(site, job, outcome)
+            metrics.inc("requests_total", stage="scrape_details", site=site, outcome=outcome)
+
+async def feed_scheduler(scheduler, incoming, scraping_map):
+    """Add jobs arriving on `incoming` (lists of jobs, then None) to the
+    scheduler, then close it."""
+    try:
+        while True:
+            jobs = await incoming.get()
+            if jobs is None:
+                break
+            for job in jobs:
+                if job['site'] not in scheduler.limiters:
+                    config = scraping_map.get(SITE_NAME_MAP.get(job['site'], job['site']), {})
+                    scheduler.add_site(job['site'], SiteLimiter(
+                        job['site'], config.get('max_concurrency', 4), config.get('rate')
+                    ))
+                scheduler.add(job['site'], job)
+    finally:
+        scheduler.close()
+
+@metrics.instrumented("scrape_details")
+async def scrape_details(incoming=None, on_saved=None):
+    """Scrape new and stale job details.
+
+    `incoming` is an optional asyncio.Queue of newly discovered job lists
+    (ending with None) that are scraped as they arrive, and `on_saved` is
+    called with each batch of details once it is in the database.
+    """
+    store = None
     try:
         log("Starting scrape_details.py")
         
@@ -107,67 +414,101 @@ async def scrape_details():
             log("Error: job-details-scraping-map.json not found.")
             return
 
-        # Load jobs
-        try:
-            with open(os.path.join(BASE_DIR, 'static/jobs.json'), 'r') as f:
-                jobs = json.load(f)
-        except FileNotFoundError:
-            log("Error: jobs.json not found.")
+        store = JobStore()
+
+        # Load jobs and the URLs that already have details
+        jobs = list(store.iter_jobs())
+        if not jobs and incoming is None:
+            log("Error: no jobs found. Run scrape_urls.py first.")
             return
 
-        # Load existing details
-        job_details = {}
-        try:
-            with open(os.path.join(BASE_DIR, 'static/job_details.json'), 'r') as f:
-                job_details = json.load(f)
-                log(f"Loaded {len(job_details)} existing job details.")
-        except (FileNotFoundError, json.JSONDecodeError):
-            log("No existing job details found. Starting fresh.")
+        existing_detail_urls = store.detail_urls()
+        refresh_state = store.get_refresh_state()
+        log(f"Loaded {len(existing_detail_urls)} existing job details.")
 
-        # Identify tasks
+        # New jobs, plus unexpired details older than their site's max age
+        now = datetime.now()
         jobs_to_scrape = []
+        due = []
         for job in jobs:
-            url = job.get('url')
-            if url in job_details:
-                 # Update last_seen in memory
-                 job_details[url]["seen"] = True
-                 job_details[url]["last_seen"] = datetime.now().isoformat()
-            else:
-                 jobs_to_scrape.append(job)
-
-        log(f"Found {len(jobs_to_scrape)} jobs to scrape.")
-
-        if jobs_to_scrape:
-            lock = asyncio.Lock()
-            sem = asyncio.Semaphore(10) # 10 concurrent tabs
-
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=True,
-                    args=['--disable-blink-features=AutomationControlled']
-                )
-                context = await browser.new_context(
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-                    ignore_https_errors=True
-                )
-                
-                await context.route("**/*", lambda route: route.abort() if route.request.resource_type in ["image", "media", "font"] else route.continue_())
-
-                tasks = [scrape_single_job(context, job, scraping_map, job_details, lock, sem) for job in jobs_to_scrape]
-                await asyncio.gather(*tasks)
-
-                await context.close()
-                await browser.close()
-        
-        # Save all results at the end
-        log("Saving results...")
-        with open(os.path.join(BASE_DIR, 'static/job_details.json'), 'w') as f:
-            json.dump(job_details, f, indent=2)
+            url = job['url']
+            if url not in existing_detail_urls:
+                jobs_to_scrape.append(job)
+            elif url in refresh_state:
+                config = scraping_map.get(SITE_NAME_MAP.get(job['site'], job['site']), {})
+                if needs_refresh(refresh_state[url], config.get('max_age_hours', DEFAULT_MAX_AGE_HOURS), now):
+                    due.append(job)
+
+        # Longest-unchecked first; the rest wait for a later run
+        due.sort(key=lambda job: refresh_state[job['url']]["checked_at"] or "")
+        refresh = {job['url']: refresh_state[job['url']] for job in due[:MAX_REFRESHES_PER_RUN]}
+        jobs_to_scrape.extend(due[:MAX_REFRESHES_PER_RUN])
+
+        # Update last_seen for jobs that are still listed
+        store.mark_details_seen(set(refresh_state) - set(refresh), now.isoformat())
+
+        log(f"Found {len(jobs_to_scrape) - len(refresh)} new jobs to scrape and {len(refresh)} to refresh"
+            f" ({len(due) - len(refresh)} more due later).")
+
+        # Results go to the database in small batches as they come in, so an
+        # interrupted run keeps its work and the next run resumes after it
+        changed = 0
+
+        def save(batch):
+            nonlocal changed
+            store.upsert_details(batch, changed_stage=CLEAN_STAGE)
+            changed += sum(1 for detail in batch.values() if detail.get("changed"))
+            metrics.inc("stage_items_total", len(batch), stage="scrape_details")
+            if on_saved:
+                on_saved(batch)
+
+        writer = BatchWriter(store, save)
+        if jobs_to_scrape or incoming is not None:
+            # Per-site concurrency caps and rates from the scraping map
+            scheduler = SiteScheduler(limiters_from_config({
+                site: scraping_map.get(SITE_NAME_MAP.get(site, site), {})
+                for site in {job['site'] for job in jobs_to_scrape}
+            }), closed=incoming is None, key=lambda job: job['url'])
+            for job in jobs_to_scrape:
+                scheduler.add(job['site'], job)
+            workers = WORKER_COUNT if incoming is not None else min(WORKER_COUNT, len(jobs_to_scrape))
+
+            # Workers share one pooled HTTP client and a small pool of tabs
+            try:
+                async with async_playwright() as p, httpx.AsyncClient(
+                    headers={"User-Agent": USER_AGENT},
+                    follow_redirects=True,
+                    verify=False,
+                    timeout=HTTP_TIMEOUT,
+                    limits=httpx.Limits(max_connections=HTTP_CONCURRENCY)
+                ) as client:
+                    pages = PagePool(p, PAGE_POOL_SIZE)
+                    feeder = [feed_scheduler(scheduler, incoming, scraping_map)] if incoming is not None else []
+                    # Results also go out on a timer, not only when the next one arrives
+                    flusher = asyncio.create_task(writer.flush_periodically())
+                    try:
+                        await asyncio.gather(*feeder, *[
+                            job_worker(scheduler, scraping_map, writer, pages, client, refresh)
+                            for _ in range(workers)
+                        ])
+                    finally:
+                        flusher.cancel()
+                        await pages.close()
+            finally:
+                writer.flush()
+                store.checkpoint()
+
+        # Only new, edited or expired URLs were queued for the cleaning stage
+        log(f"Queued {changed} new or changed job details for cleaning; "
+            f"{writer.written - changed} refreshed pages were unchanged.")
         
-        log(f"Completed scrape_details.py. Total details: {len(job_details)}")
+        log(f"Completed scrape_details.py. Total details: {store.count_details()}")
         
     except Exception as e:
         log(f"Critical error in scrape_details: {e}")
+    finally:
+        if store is not None:
+            store.close()
 
 if __name__ == "__main__":
     asyncio.run(scrape_details())
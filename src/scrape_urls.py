@@ -1,28 +1,137 @@
 import json
 import os
 import asyncio
+import time
 from datetime import datetime
-from urllib.parse import urljoin
-from playwright.async_api import async_playwright
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from scheduler import SiteScheduler, limiters_from_config, OK, EMPTY, ERROR, TIMEOUT, THROTTLED
+from storage import JobStore, BatchWriter
+import metrics
 
 # Base directory for resolving file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# Listing pages loaded at the same time across all sites
+MAX_CONCURRENT_SITES = 5
+
+# HTTP statuses that mean a site wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+# Listing pages read per site when "pagination" doesn't set "max_pages"
+DEFAULT_MAX_PAGES = 5
+
+# Half-second checks for more items after scrolling an infinite list
+SCROLL_WAIT_STEPS = 10
+
+# Callables that also receive every log line (the web UI when run in-process)
+log_listeners = []
+
 def log(message):
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
+    print(line)
+    for listener in log_listeners:
+        listener(line)
 
-async def scrape_site_urls(context, site_config, existing_urls, lock, new_jobs_list):
+def page_url(url, pagination, page_number):
+    """Listing URL for `page_number` (1-based) with a URL page parameter."""
+    parts = urlparse(url)
+    query = parse_qs(parts.query, keep_blank_values=True)
+    query[pagination["param"]] = [str(pagination.get("start", 1) + page_number - 1)]
+    return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+
+# Runs in the page: reads every listing item in one round-trip instead of
+# several locator calls per item
+EXTRACT_ITEMS_JS = """
+(items, [start, urlSelector, titleSelector, dateSelector]) => {
+    const text = (item, selector) => {
+        const el = selector ? item.querySelector(selector) : null;
+        if (!el) return null;
+        return (el.getAttribute('datetime') || el.innerText || '').trim() || null;
+    };
+    return {
+        count: items.length,
+        items: items.slice(start).map(item => {
+            const link = item.querySelector(urlSelector);
+            return {
+                href: link ? link.getAttribute('href') : null,
+                title: text(item, titleSelector),
+                posted_at: text(item, dateSelector)
+            };
+        })
+    };
+}
+"""
+
+async def extract_items(page, site_config, base_url, start=0):
+    """Listing items from index `start` onwards as {url, title, posted_at}
+    dicts, plus the total number of items on the page."""
+    items = page.locator(site_config["list_selector"]).first.locator(site_config["list_item_selector"])
+    result = await items.evaluate_all(EXTRACT_ITEMS_JS, [
+        start,
+        site_config["item_url"],
+        site_config.get("item_title"),
+        site_config.get("item_date")
+    ])
+    listing = [
+        {"url": urljoin(base_url, item["href"]), "title": item["title"], "posted_at": item["posted_at"]}
+        for item in result["items"] if item["href"]
+    ]
+    return listing, result["count"]
+
+async def next_page(page, site_config, pagination, page_number, item_count):
+    """Advance the listing to `page_number`. Returns False when there is no more."""
+    kind = pagination["type"]
+    if kind == "param":
+        response = await page.goto(page_url(site_config["url"], pagination, page_number), timeout=60000)
+        if response is not None and response.status >= 400:
+            return False
+        await page.wait_for_selector(site_config["list_selector"], timeout=10000)
+        return True
+
+    if kind == "next":
+        next_link = page.locator(pagination["selector"]).first
+        if await next_link.count() == 0:
+            return False
+        href = await next_link.get_attribute("href")
+        if href:
+            await page.goto(urljoin(page.url, href), timeout=60000)
+        else:
+            await next_link.click()
+            await page.wait_for_load_state()
+        await page.wait_for_selector(site_config["list_selector"], timeout=10000)
+        return True
+
+    if kind == "scroll":
+        await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        items = page.locator(site_config["list_selector"]).first.locator(site_config["list_item_selector"])
+        # Wait for the infinite scroll to append more items
+        for _ in range(SCROLL_WAIT_STEPS):
+            await page.wait_for_timeout(500)
+            if await items.count() > item_count:
+                return True
+        return False
+
+    log(f"Unknown pagination type '{kind}' for {site_config.get('name')}")
+    return False
+
+async def scrape_site_urls(context, site_config, existing_urls, writer, limiter=None):
     site_name = site_config.get("name")
     url = site_config.get("url")
     list_selector = site_config.get("list_selector")
-    list_item_selector = site_config.get("list_item_selector")
-    item_url_selector = site_config.get("item_url")
+    pagination = site_config.get("pagination")
+    max_pages = pagination.get("max_pages", DEFAULT_MAX_PAGES) if pagination else 1
 
     log(f"Scraping {site_name}...")
     
     try:
         page = await context.new_page()
-        await page.goto(url, timeout=60000)
+        load_start = time.perf_counter()
+        response = await page.goto(url, timeout=60000)
+        if response is not None and response.status in THROTTLE_STATUSES:
+            log(f"Throttled ({response.status}) on {site_name}")
+            await page.close()
+            return THROTTLED
         
         # Wait for the list container
         try:
@@ -30,49 +139,90 @@ async def scrape_site_urls(context, site_config, existing_urls, lock, new_jobs_l
         except:
             log(f"Time out waiting for list selector on {site_name}")
             await page.close()
-            return
-
-        container = page.locator(list_selector).first
-        
-        items = container.locator(list_item_selector)
-        count = await items.count()
-        log(f"Found {count} potential jobs on {site_name}")
+            return TIMEOUT
+        metrics.observe("page_load_seconds", time.perf_counter() - load_start, stage="scrape_urls", site=site_name)
 
         local_new_count = 0
+        total_count = 0
+        item_count = 0
+        page_number = 1
         
-        for i in range(count):
+        while True:
+            # With infinite scroll only the newly appended items are a "page"
+            start = item_count if pagination and pagination["type"] == "scroll" else 0
+            with metrics.timer("extract_seconds", stage="scrape_urls", site=site_name):
+                listing, item_count = await extract_items(page, site_config, page.url or url, start)
+            total_count += len(listing)
+            log(f"Found {len(listing)} potential jobs on {site_name} (page {page_number})")
+
+            page_new_count = 0
+            for item in listing:
+                full_url = item["url"]
+                if full_url not in existing_urls:
+                    writer.add(full_url, {
+                        "site": site_name,
+                        "url": full_url,
+                        "found_at": datetime.now().isoformat(),
+                        "listing_title": item["title"],
+                        "posted_at": item["posted_at"]
+                    })
+                    existing_urls.add(full_url)
+                    page_new_count += 1
+                    log(f"Found new job: {full_url}")
+            # Each finished page is saved before the next one loads
+            writer.flush()
+            local_new_count += page_new_count
+
+            # Listings are newest first, so a page of known URLs means we've caught up
+            if listing and page_new_count == 0:
+                if page_number < max_pages:
+                    log(f"Page {page_number} of {site_name} only has known jobs, stopping early.")
+                break
+            if not listing or page_number >= max_pages:
+                break
+
+            page_number += 1
+            if limiter is not None:
+                await limiter.pace()
             try:
-                item = items.nth(i)
-                link_element = item.locator(item_url_selector).first
-                
-                href = await link_element.get_attribute("href")
-                if not href:
-                    continue
-                
-                full_url = urljoin(url, href)
-                
-                async with lock:
-                    if full_url not in existing_urls:
-                        job_entry = {
-                            "site": site_name,
-                            "url": full_url,
-                            "found_at": datetime.now().isoformat()
-                        }
-                        new_jobs_list.append(job_entry)
-                        existing_urls.add(full_url)
-                        local_new_count += 1
-                        log(f"Found new job: {full_url}")
+                with metrics.timer("page_load_seconds", stage="scrape_urls", site=site_name):
+                    more = await next_page(page, site_config, pagination, page_number, item_count)
+                if not more:
+                    break
             except Exception as e:
-                continue
+                log(f"Could not load page {page_number} of {site_name}: {e}")
+                break
 
         log(f"Finished {site_name}. New jobs: {local_new_count}")
         await page.close()
+        return OK if total_count else EMPTY
 
+    except PlaywrightTimeoutError as e:
+        log(f"Timed out scraping {site_name}: {e}")
+        return TIMEOUT
     except Exception as e:
         log(f"Failed to scrape {site_name}: {e}")
+        return ERROR
+
+async def site_worker(context, scheduler, existing_urls, writer):
+    """Scrape listings for whichever site is ready next until none are left."""
+    while True:
+        task = await scheduler.next()
+        if task is None:
+            break
+        site_name, site_config = task
+        outcome = ERROR
+        try:
+            outcome = await scrape_site_urls(context, site_config, existing_urls, writer, scheduler.limiters[site_name])
+        finally:
+            scheduler.done(site_name, site_config, outcome)
+            metrics.inc("requests_total", stage="scrape_urls", site=site_name, outcome=outcome)
 
 
-async def scrape_urls():
+@metrics.instrumented("scrape_urls")
+async def scrape_urls(on_saved=None):
+    """Discover new job URLs on every site in sites.json. `on_saved` is
+    called with each list of new jobs once it is in the database."""
     try:
         log("Starting scrape_urls.py")
         
@@ -85,50 +235,58 @@ async def scrape_urls():
             return
 
         # Load existing jobs to avoid duplicates
-        existing_urls = set()
-        try:
-            with open(os.path.join(BASE_DIR, "static/jobs.json"), "r") as f:
-                existing_jobs = json.load(f)
-                for job in existing_jobs:
-                    if "url" in job:
-                        existing_urls.add(job["url"])
+        store = JobStore()
+        existing_urls = store.job_urls()
+        if existing_urls:
             log(f"Loaded {len(existing_urls)} existing jobs.")
-        except (FileNotFoundError, json.JSONDecodeError):
-            existing_jobs = []
+        else:
             log("No existing jobs found. Starting fresh.")
 
-        new_jobs_list = []
-        lock = asyncio.Lock()
+        # New jobs are saved page by page, so a crash keeps what was found
+        def save(batch):
+            store.add_jobs(batch.values())
+            metrics.inc("stage_items_total", len(batch), stage="scrape_urls")
+            if on_saved:
+                on_saved(list(batch.values()))
+
+        writer = BatchWriter(store, save)
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=["--disable-blink-features=AutomationControlled"]
-            )
-            
-            context = await browser.new_context(
-                 user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
-                 ignore_https_errors=True
-            )
-            
-            await context.route("**/*", lambda route: route.abort() if route.request.resource_type in ["image", "media", "font"] else route.continue_())
+        try:
+            async with async_playwright() as p:
+                browser = await p.chromium.launch(
+                    headless=True,
+                    args=["--disable-blink-features=AutomationControlled"]
+                )
+                
+                context = await browser.new_context(
+                     user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+                     ignore_https_errors=True
+                )
+                
+                await context.route("**/*", lambda route: route.abort() if route.request.resource_type in ["image", "media", "font"] else route.continue_())
 
-            tasks = []
-            for site in sites_config:
-                tasks.append(scrape_site_urls(context, site, existing_urls, lock, new_jobs_list))
-            
-            await asyncio.gather(*tasks)
-            
-            await context.close()
-            await browser.close()
-            
-        if new_jobs_list:
-            log(f"Total new jobs found: {len(new_jobs_list)}")
-            existing_jobs.extend(new_jobs_list)
+                # Per-site caps and rates from sites.json, bounded overall
+                scheduler = SiteScheduler(
+                    limiters_from_config({site["name"]: site for site in sites_config}),
+                    key=lambda site: site["name"]
+                )
+                for site in sites_config:
+                    scheduler.add(site["name"], site)
+                
+                await asyncio.gather(*[
+                    site_worker(context, scheduler, existing_urls, writer)
+                    for _ in range(min(MAX_CONCURRENT_SITES, len(sites_config)))
+                ])
+                
+                await context.close()
+                await browser.close()
+        finally:
+            writer.flush()
+            store.checkpoint()
+            store.close()
             
-            with open(os.path.join(BASE_DIR, "static/jobs.json"), "w") as f:
-                json.dump(existing_jobs, f, indent=4)
-            log("Updated jobs.json")
+        if writer.written:
+            log(f"Total new jobs found: {writer.written}")
         else:
             log("No new jobs found.")
             
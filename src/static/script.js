@@ -2,7 +2,10 @@
 const jobsTbody = document.getElementById('jobs-tbody');
 const searchInput = document.getElementById('search-input');
 const filterSite = document.getElementById('filter-site');
+const filterStatus = document.getElementById('filter-status');
+const sortMatches = document.getElementById('sort-matches');
 const btnFullScrape = document.getElementById('btn-full-scrape');
+const btnRematch = document.getElementById('btn-rematch');
 const statusBanner = document.getElementById('status-banner');
 const statusMessage = document.getElementById('status-message');
 const modal = document.getElementById('modal');
@@ -32,12 +35,12 @@ const statSites = document.getElementById('stat-sites');
 
 // State
 let matchingJobs = [];
+let matchingPagination = { total: 0 };
 let currentPage = 1;
 let totalPages = 1;
 let perPage = 20;
-let statusCheckInterval = null;
+let eventSource = null;
 let searchTimeout = null;
-let lastLogCount = 0;
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -54,29 +57,32 @@ function setupEventListeners() {
         clearTimeout(searchTimeout);
         searchTimeout = setTimeout(() => {
             currentPage = 1;
-            renderMatchingJobs();
+            loadMatchingJobs();
         }, 300);
     });
     
-    filterSite.addEventListener('change', () => {
-        currentPage = 1;
-        renderMatchingJobs();
+    [filterSite, filterStatus, sortMatches].forEach(select => {
+        select.addEventListener('change', () => {
+            currentPage = 1;
+            loadMatchingJobs();
+        });
     });
     
     btnFullScrape.addEventListener('click', startFullScrape);
+    btnRematch.addEventListener('click', startRematch);
     
     // Pagination
     btnPrev.addEventListener('click', () => {
         if (currentPage > 1) {
             currentPage--;
-            renderMatchingJobs();
+            loadMatchingJobs();
         }
     });
     
     btnNext.addEventListener('click', () => {
         if (currentPage < totalPages) {
             currentPage++;
-            renderMatchingJobs();
+            loadMatchingJobs();
         }
     });
     
@@ -101,12 +107,23 @@ function setupEventListeners() {
 }
 
 
-// Load Matching Jobs (Matching Jobs tab)
+// Load one page of Matching Jobs (filtered, sorted and paginated server-side)
 async function loadMatchingJobs() {
+    const params = new URLSearchParams({
+        page: currentPage,
+        per_page: perPage,
+        sort: sortMatches.value,
+        status: filterStatus.value,
+        search: searchInput.value,
+        site: filterSite.value
+    });
+    
     try {
-        const response = await fetch('/api/matching/jobs');
-        matchingJobs = await response.json();
-        statMatches.textContent = matchingJobs.length;
+        const response = await fetch(`/api/matching/jobs?${params}`);
+        const data = await response.json();
+        matchingJobs = data.jobs;
+        matchingPagination = data.pagination;
+        totalPages = data.pagination.total_pages || 1;
         renderMatchingJobs();
     } catch (error) {
         console.error('Error loading matching jobs:', error);
@@ -116,29 +133,13 @@ async function loadMatchingJobs() {
 
 // Render Matching Jobs
 function renderMatchingJobs() {
-    const searchTerm = searchInput.value.toLowerCase();
-    
-    let filtered = matchingJobs.filter(job => {
-        const matchesSearch = 
-            job.title.toLowerCase().includes(searchTerm) ||
-            job.url.toLowerCase().includes(searchTerm);
-        return matchesSearch;
-    });
-    
-    // Pagination (client-side for matching jobs as it's a smaller set)
-    const total = filtered.length;
-    totalPages = Math.ceil(total / perPage) || 1;
-    const start = (currentPage - 1) * perPage;
-    const end = start + perPage;
-    const paginated = filtered.slice(start, end);
-    
-    if (paginated.length === 0) {
+    if (matchingJobs.length === 0) {
         jobsTbody.innerHTML = '<tr><td colspan="6" class="loading-cell">No matching jobs found. Click "Scrape & Match" to start.</td></tr>';
         updatePagination({ page: 1, total_pages: 1, total: 0 });
         return;
     }
     
-    jobsTbody.innerHTML = paginated.map(job => {
+    jobsTbody.innerHTML = matchingJobs.map(job => {
         const date = new Date(job.matched_at).toLocaleDateString();
         let statusClass = 'badge--success';
         let statusText = 'Match';
@@ -151,10 +152,14 @@ function renderMatchingJobs() {
             statusText = 'New Match';
         }
         
+        // The same posting found on other boards
+        const altCount = (job.alternate_urls || []).length;
+        const alternates = altCount ? ` <span class="text-secondary">+${altCount}</span>` : '';
+        
         return `
             <tr>
                 <td><span class="score-badge">${(job.score * 100).toFixed(0)}%</span></td>
-                <td>${getSiteFromUrl(job.url)}</td>
+                <td>${getSiteFromUrl(job.url)}${alternates}</td>
                 <td>${escapeHtml(job.title)}</td>
                 <td><span class="badge ${statusClass}">${statusText}</span></td>
                 <td><span class="text-secondary">${date}</span></td>
@@ -167,7 +172,7 @@ function renderMatchingJobs() {
         `;
     }).join('');
     
-    updatePagination({ page: currentPage, total_pages: totalPages, total: total });
+    updatePagination({ page: currentPage, total_pages: totalPages, total: matchingPagination.total });
 }
 
 // Get site name from URL
@@ -206,6 +211,7 @@ async function loadStats() {
         const stats = await response.json();
         
         statTotal.textContent = stats.total_urls;
+        statMatches.textContent = stats.match_count;
         statDetails.textContent = stats.total_details;
         statSites.textContent = Object.keys(stats.sites).length;
     } catch (error) {
@@ -236,8 +242,8 @@ function getStatusBadge(job) {
 }
 
 
-// View Matching Job Details
-function viewMatchingJob(url) {
+// View Matching Job Details (the description is fetched on demand)
+async function viewMatchingJob(url) {
     const job = matchingJobs.find(j => j.url === url);
     if (!job) return;
     
@@ -247,14 +253,23 @@ function viewMatchingJob(url) {
     }
     
     modalTitle.textContent = job.title;
-    modalSite.textContent = getSiteFromUrl(job.url);
+    modalSite.textContent = [job.url, ...(job.alternate_urls || [])].map(getSiteFromUrl).join(' · ');
     modalScore.textContent = `Match Score: ${(job.score * 100).toFixed(1)}%`;
     modalScore.classList.remove('hidden');
     modalLink.href = job.url;
     modalLink.onclick = null; // Remove click handler
-    modalDescription.textContent = job.description || 'No description available.';
+    modalDescription.textContent = 'Loading description...';
     
     modal.classList.remove('hidden');
+    
+    try {
+        const response = await fetch(`/api/matching/description?${new URLSearchParams({ url })}`);
+        const data = await response.json();
+        modalDescription.textContent = data.description || 'No description available.';
+    } catch (error) {
+        console.error('Error loading description:', error);
+        modalDescription.textContent = 'No description available.';
+    }
 }
 
 async function markAsViewed(url) {
@@ -277,61 +292,69 @@ async function markAsViewed(url) {
 }
 
 // Start Full Scrape Process
-async function startFullScrape() {
+function startFullScrape() {
+    startProcess('/api/scrape/full', 'Starting unified process...');
+}
+
+// Re-run matching only (e.g. after editing the resume)
+function startRematch() {
+    startProcess('/api/matching/run', 'Starting matching...');
+}
+
+async function startProcess(endpoint, startText) {
     btnFullScrape.disabled = true;
-    logContent.innerHTML = '<div class="log-line">Starting unified process...</div>';
+    btnRematch.disabled = true;
+    logContent.innerHTML = `<div class="log-line">${startText}</div>`;
     logModal.classList.remove('hidden');
-    lastLogCount = 0;
     
     try {
-        const response = await fetch('/api/scrape/full', { method: 'POST' });
+        const response = await fetch(endpoint, { method: 'POST' });
         const result = await response.json();
         
         if (result.success) {
-            startStatusPolling();
+            startEventStream();
         } else {
             addLogLine(`Error: ${result.message}`);
             btnFullScrape.disabled = false;
+            btnRematch.disabled = false;
         }
     } catch (error) {
-        console.error('Error starting full scrape:', error);
+        console.error('Error starting process:', error);
         addLogLine('Error connecting to server.');
         btnFullScrape.disabled = false;
+        btnRematch.disabled = false;
     }
 }
 
-// Status Polling for Logs and Progress
-function startStatusPolling() {
-    if (statusCheckInterval) clearInterval(statusCheckInterval);
+// Stream logs and status changes from the server while a run is going
+function startEventStream() {
+    if (eventSource) eventSource.close();
     
-    statusCheckInterval = setInterval(async () => {
-        try {
-            const response = await fetch('/api/scrape/status');
-            const status = await response.json();
-            
-            // Update logs
-            if (status.logs && status.logs.length > lastLogCount) {
-                const newLogs = status.logs.slice(lastLogCount);
-                newLogs.forEach(line => addLogLine(line));
-                lastLogCount = status.logs.length;
-                // Auto-scroll to bottom
-                logContent.scrollTop = logContent.scrollHeight;
-            }
-            
-            if (!status.running) {
-                clearInterval(statusCheckInterval);
-                statusCheckInterval = null;
-                btnFullScrape.disabled = false;
-                addLogLine(`\n --- Process Completed: ${status.message} ---`);
-                
-                // Refresh data
-                loadStats();
-                loadMatchingJobs();
-            }
-        } catch (error) {
-            console.error('Error checking status:', error);
-        }
-    }, 500);
+    eventSource = new EventSource('/api/scrape/events');
+    
+    eventSource.addEventListener('log', (e) => {
+        JSON.parse(e.data).forEach(line => addLogLine(line));
+        // Auto-scroll to bottom
+        logContent.scrollTop = logContent.scrollHeight;
+    });
+    
+    eventSource.addEventListener('done', (e) => {
+        const status = JSON.parse(e.data);
+        eventSource.close();
+        eventSource = null;
+        btnFullScrape.disabled = false;
+        btnRematch.disabled = false;
+        addLogLine(`\n --- Process Completed: ${status.message} ---`);
+        
+        // Refresh data
+        loadStats();
+        loadMatchingJobs();
+    });
+    
+    // The browser reconnects on its own and resumes after the last line it got
+    eventSource.onerror = (error) => {
+        console.error('Event stream interrupted:', error);
+    };
 }
 
 // Helper to add log line
@@ -0,0 +1,712 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+# Base directory for resolving file paths
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DB_PATH = os.path.join(BASE_DIR, 'static/jobs.db')
+
+# Stages that consume the change set produced by the stage before them
+CLEAN_STAGE = 'clean_job_details'
+DEDUP_STAGE = 'dedup'
+MATCH_STAGE = 'matching'
+
+# Jobs revisions whose changed URLs stay in job_changes; a reader further
+# behind than this rebuilds its view from scratch
+JOB_CHANGES_KEPT = 1000
+
+# A write touching more URLs than this (like marking every detail seen
+# again after a scrape) clears job_changes instead of logging each URL, so
+# readers rebuild once rather than replay the whole corpus row by row
+JOB_CHANGES_MAX_URLS = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    found_at TEXT,
+    listing_title TEXT,
+    posted_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_site ON jobs(site);
+
+CREATE TABLE IF NOT EXISTS job_details (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    scraped_at TEXT,
+    seen INTEGER NOT NULL DEFAULT 0,
+    last_seen TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    checked_at TEXT,
+    expired_at TEXT,
+    empty_refreshes INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_job_details_seen ON job_details(seen);
+
+CREATE TABLE IF NOT EXISTS cleaned_jobs (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    cleaned_text TEXT
+);
+
+CREATE TABLE IF NOT EXISTS matches (
+    url TEXT PRIMARY KEY,
+    title TEXT,
+    score REAL,
+    description TEXT,
+    matched_at TEXT,
+    is_new INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'matched',
+    resume TEXT,
+    alternate_urls TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_matches_status ON matches(status);
+CREATE INDEX IF NOT EXISTS idx_matches_score ON matches(score);
+CREATE INDEX IF NOT EXISTS idx_matches_matched_at ON matches(matched_at);
+
+-- MinHash signatures of cleaned_text and the near-duplicate clusters they imply
+CREATE TABLE IF NOT EXISTS job_signatures (
+    url TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS duplicates (
+    url TEXT PRIMARY KEY,
+    canonical_url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_duplicates_canonical ON duplicates(canonical_url);
+
+CREATE TABLE IF NOT EXISTS pending_changes (
+    stage TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (stage, url)
+) WITHOUT ROWID;
+
+-- Change counters so readers can cheaply tell whether cached views are stale,
+-- bumped once per write that changed any rows
+CREATE TABLE IF NOT EXISTS revisions (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO revisions (name, value) VALUES ('jobs', 0);
+INSERT OR IGNORE INTO revisions (name, value) VALUES ('matches', 0);
+
+-- URLs touched by each jobs revision, so the dashboard's job index can
+-- refresh just those rows (only the last JOB_CHANGES_KEPT revisions are kept)
+CREATE TABLE IF NOT EXISTS job_changes (
+    revision INTEGER NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_changes_revision ON job_changes(revision);
+
+-- Revisions used to be bumped by per-row triggers, which made a batch of
+-- 25 upserts look like 25 changes; JobStore now bumps them once per write
+DROP TRIGGER IF EXISTS jobs_insert_rev;
+DROP TRIGGER IF EXISTS jobs_delete_rev;
+DROP TRIGGER IF EXISTS details_insert_rev;
+DROP TRIGGER IF EXISTS details_update_rev;
+DROP TRIGGER IF EXISTS details_delete_rev;
+DROP TRIGGER IF EXISTS matches_insert_rev;
+DROP TRIGGER IF EXISTS matches_update_rev;
+DROP TRIGGER IF EXISTS matches_delete_rev;
+
+CREATE TABLE IF NOT EXISTS stage_runs (
+    stage TEXT PRIMARY KEY,
+    last_run TEXT,
+    info TEXT
+);
+
+-- Metrics each stage recorded during one run (see metrics.py)
+CREATE TABLE IF NOT EXISTS run_metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    stage TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    seconds REAL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_run_metrics_stage ON run_metrics(stage, id);
+"""
+
+# Columns added after a table was first created: {table: {column: definition}}
+ADDED_COLUMNS = {
+    "jobs": {"listing_title": "TEXT", "posted_at": "TEXT"},
+    "job_details": {
+        "etag": "TEXT",
+        "last_modified": "TEXT",
+        "content_hash": "TEXT",
+        "checked_at": "TEXT",
+        "expired_at": "TEXT",
+        "empty_refreshes": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "matches": {"resume": "TEXT", "alternate_urls": "TEXT"},
+}
+
+
+def _chunks(items, size=500):
+    """Split `items` so IN (...) lists stay under SQLite's variable limit."""
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class JobStore:
+    """Repository over the SQLite database shared by the scripts and the app.
+
+    Every instance owns its own connection, so use one per thread (the app
+    opens one per request). WAL mode lets the pipeline write while the web
+    UI reads, and the busy timeout serializes concurrent writers.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """Add columns that databases created by older versions lack."""
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def checkpoint(self):
+        """Fold the write-ahead log back into the database file so it stays small."""
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def revision(self, name):
+        """Counter bumped whenever a write changes the tables behind `name`."""
+        row = self.conn.execute("SELECT value FROM revisions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump_revision(self, name, changes_before):
+        """Bump `name` once, inside the current transaction, if it changed rows
+        since `self.conn.total_changes` was `changes_before`. Returns the new
+        revision, or None if nothing changed."""
+        if self.conn.total_changes == changes_before:
+            return None
+        self.conn.execute("UPDATE revisions SET value = value + 1 WHERE name = ?", (name,))
+        return self.revision(name)
+
+    def _jobs_changed(self, changes_before, urls):
+        """Bump the jobs revision if the write changed rows, logging `urls`
+        under it in job_changes (or clearing the log for bulk writes)."""
+        revision = self._bump_revision('jobs', changes_before)
+        if revision is None:
+            return
+        if len(urls) > JOB_CHANGES_MAX_URLS:
+            self.conn.execute("DELETE FROM job_changes")
+            return
+        self.conn.executemany(
+            "INSERT INTO job_changes (revision, url) VALUES (?, ?)", [(revision, url) for url in urls]
+        )
+        self.conn.execute("DELETE FROM job_changes WHERE revision <= ?", (revision - JOB_CHANGES_KEPT,))
+
+    def job_changes_since(self, revision):
+        """(URLs changed after jobs revision `revision`, latest revision), or
+        None if the change log no longer covers every revision since then."""
+        current = self.revision('jobs')
+        if current < revision:
+            return None
+        rows = self.conn.execute(
+            "SELECT revision, url FROM job_changes WHERE revision > ?", (revision,)
+        ).fetchall()
+        revisions = {row[0] for row in rows}
+        if not set(range(revision + 1, current + 1)) <= revisions:
+            return None
+        return {row[1] for row in rows}, max(revisions, default=revision)
+
+    # --- jobs -------------------------------------------------------------
+
+    def job_urls(self):
+        """Set of every known job URL."""
+        return {row[0] for row in self.conn.execute("SELECT url FROM jobs")}
+
+    def add_jobs(self, jobs):
+        """Insert job entries ({site, url, found_at} plus the optional listing
+        fields listing_title and posted_at), ignoring known URLs."""
+        with self.conn:
+            changes = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (url, site, found_at, listing_title, posted_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job["url"], job["site"], job.get("found_at"), job.get("listing_title"), job.get("posted_at"))
+                    for job in jobs
+                ]
+            )
+            self._jobs_changed(changes, [job["url"] for job in jobs])
+
+    def iter_jobs(self):
+        """Jobs in discovery order."""
+        for row in self.conn.execute("SELECT url, site, found_at, listing_title, posted_at FROM jobs ORDER BY rowid"):
+            yield dict(row)
+
+    def count_jobs(self):
+        return self.conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def site_counts(self):
+        rows = self.conn.execute("SELECT site, COUNT(*) FROM jobs GROUP BY site")
+        return {site: count for site, count in rows}
+
+    def iter_jobs_with_details(self, urls=None, with_description=True):
+        """Jobs in discovery order joined with their scraped details, if any,
+        optionally only those in `urls`."""
+        description = "d.description" if with_description else "NULL"
+        query = f"""
+            SELECT j.rowid, j.url, j.site, j.listing_title, j.posted_at, d.url IS NOT NULL AS has_details,
+                   d.title, {description} AS description, d.seen, d.last_seen, d.expired_at
+            FROM jobs j LEFT JOIN job_details d ON d.url = j.url
+        """
+        if urls is None:
+            rows = self.conn.execute(query + " ORDER BY j.rowid")
+        else:
+            rows = sorted(
+                (row for chunk in _chunks(urls) for row in self.conn.execute(
+                    query + f" WHERE j.url IN ({','.join('?' * len(chunk))})", chunk
+                )),
+                key=lambda row: row["rowid"]
+            )
+        for row in rows:
+            yield {
+                "site": row["site"],
+                "url": row["url"],
+                "title": row["title"] if row["title"] is not None else (row["listing_title"] or 'Not scraped yet'),
+                "posted_at": row["posted_at"],
+                "description": row["description"] or '',
+                "seen": bool(row["seen"]),
+                "last_seen": row["last_seen"],
+                "has_details": bool(row["has_details"]),
+                "expired": row["expired_at"] is not None
+            }
+
+    # --- job details ------------------------------------------------------
+
+    def detail_urls(self, include_expired=True):
+        """Set of URLs that already have scraped details."""
+        query = "SELECT url FROM job_details"
+        if not include_expired:
+            query += " WHERE expired_at IS NULL"
+        return {row[0] for row in self.conn.execute(query)}
+
+    def upsert_details(self, details, changed_stage=None):
+        """Insert or update scraped details given as {url: detail_dict}.
+
+        With `changed_stage`, details flagged `changed` are queued for that
+        stage in the same transaction, so a crash can't save a detail
+        without its change record.
+
+        A missing title, description, scraped_at, last_seen or content_hash
+        keeps the stored value, so a refresh that found the page unchanged
+        only needs to pass its check time and validators. `expired_at` is
+        always written: set it to tombstone a posting, leave it out to
+        revive one. `empty_refreshes` (consecutive refreshes that found
+        nothing) is reset to 0 unless given.
+        """
+        with self.conn:
+            changes = self.conn.total_changes
+            self.conn.executemany("""
+                INSERT INTO job_details (url, title, description, scraped_at, seen, last_seen,
+                                         etag, last_modified, content_hash, checked_at, expired_at, empty_refreshes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = COALESCE(excluded.title, title),
+                    description = COALESCE(excluded.description, description),
+                    scraped_at = COALESCE(excluded.scraped_at, scraped_at),
+                    seen = excluded.seen,
+                    last_seen = COALESCE(excluded.last_seen, last_seen),
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    checked_at = excluded.checked_at,
+                    expired_at = excluded.expired_at,
+                    empty_refreshes = excluded.empty_refreshes
+            """, [
+                (url, d.get("title"), d.get("description"), d.get("scraped_at"),
+                 int(bool(d.get("seen", False))), d.get("last_seen"),
+                 d.get("etag"), d.get("last_modified"), d.get("content_hash"),
+                 d.get("checked_at") or d.get("scraped_at"), d.get("expired_at"), d.get("empty_refreshes", 0))
+                for url, d in details.items()
+            ])
+            self._jobs_changed(changes, details)
+            if changed_stage:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO pending_changes (stage, url) VALUES (?, ?)",
+                    [(changed_stage, url) for url, d in details.items() if d.get("changed")]
+                )
+
+    def mark_details_seen(self, urls, seen_at):
+        """Flag already-scraped, unexpired URLs as seen again on this run."""
+        with self.conn:
+            changes = self.conn.total_changes
+            for chunk in _chunks(urls):
+                self.conn.execute(
+                    f"UPDATE job_details SET seen = 1, last_seen = ? "
+                    f"WHERE expired_at IS NULL AND url IN ({','.join('?' * len(chunk))})",
+                    [seen_at, *chunk]
+                )
+            self._jobs_changed(changes, urls)
+
+    def get_refresh_state(self):
+        """Validators of unexpired details as {url: {etag, last_modified,
+        content_hash, checked_at, empty_refreshes}}; checked_at falls back to
+        scraped_at."""
+        rows = self.conn.execute("""
+            SELECT url, etag, last_modified, content_hash, COALESCE(checked_at, scraped_at) AS checked_at,
+                   empty_refreshes
+            FROM job_details WHERE expired_at IS NULL
+        """)
+        return {
+            row["url"]: {
+                "etag": row["etag"],
+                "last_modified": row["last_modified"],
+                "content_hash": row["content_hash"],
+                "checked_at": row["checked_at"],
+                "empty_refreshes": row["empty_refreshes"]
+            }
+            for row in rows
+        }
+
+    def get_details(self, urls=None):
+        """Scraped details as {url: detail_dict}, optionally limited to `urls`."""
+        query = "SELECT url, title, description, scraped_at, seen, last_seen FROM job_details"
+        if urls is None:
+            rows = self.conn.execute(query + " ORDER BY rowid")
+        else:
+            rows = []
+            for chunk in _chunks(urls):
+                rows.extend(self.conn.execute(
+                    query + f" WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return {
+            row["url"]: {
+                "title": row["title"],
+                "description": row["description"],
+                "scraped_at": row["scraped_at"],
+                "seen": bool(row["seen"]),
+                "last_seen": row["last_seen"]
+            }
+            for row in rows
+        }
+
+    def iter_detail_chunks(self, urls, size=500):
+        """Details of `urls` as lists of (url, detail_dict), `size` at a time,
+        so a large set never has to be loaded at once."""
+        urls = list(urls)
+        for i in range(0, len(urls), size):
+            yield list(self.get_details(urls[i:i + size]).items())
+
+    def count_details(self):
+        return self.conn.execute("SELECT COUNT(*) FROM job_details").fetchone()[0]
+
+    def count_expired(self):
+        return self.conn.execute("SELECT COUNT(*) FROM job_details WHERE expired_at IS NOT NULL").fetchone()[0]
+
+    def count_seen(self):
+        return self.conn.execute("SELECT COUNT(*) FROM job_details WHERE seen = 1").fetchone()[0]
+
+    # --- cleaned jobs -----------------------------------------------------
+
+    def cleaned_urls(self):
+        return {row[0] for row in self.conn.execute("SELECT url FROM cleaned_jobs")}
+
+    def get_cleaned(self):
+        """Cleaned jobs as {url: {title, cleaned_text}} in scrape order."""
+        rows = self.conn.execute("""
+            SELECT c.url, c.title, c.cleaned_text FROM cleaned_jobs c
+            LEFT JOIN job_details d ON d.url = c.url
+            ORDER BY d.rowid, c.rowid
+        """)
+        return {row["url"]: {"title": row["title"], "cleaned_text": row["cleaned_text"]} for row in rows}
+
+    def save_cleaned(self, cleaned, removed=()):
+        """Upsert cleaned jobs ({url: {title, cleaned_text}}) and drop `removed`."""
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO cleaned_jobs (url, title, cleaned_text) VALUES (?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET title = excluded.title, cleaned_text = excluded.cleaned_text
+            """, [(url, c["title"], c["cleaned_text"]) for url, c in cleaned.items()])
+            for chunk in _chunks(removed):
+                self.conn.execute(
+                    f"DELETE FROM cleaned_jobs WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                )
+
+    # --- near-duplicates --------------------------------------------------
+
+    def get_signatures(self):
+        """Stored MinHash signatures as {url: bytes}."""
+        return {row[0]: row[1] for row in self.conn.execute("SELECT url, signature FROM job_signatures")}
+
+    def save_signatures(self, signatures, removed=()):
+        """Upsert signatures ({url: bytes}) and drop `removed`."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO job_signatures (url, signature) VALUES (?, ?)",
+                signatures.items()
+            )
+            for chunk in _chunks(removed):
+                self.conn.execute(
+                    f"DELETE FROM job_signatures WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                )
+
+    def get_duplicates(self):
+        """{url: canonical_url} for every posting that duplicates another."""
+        return {row[0]: row[1] for row in self.conn.execute("SELECT url, canonical_url FROM duplicates")}
+
+    def save_duplicates(self, duplicates):
+        """Replace the duplicate clusters with `duplicates` ({url: canonical_url})."""
+        with self.conn:
+            self.conn.execute("DELETE FROM duplicates")
+            self.conn.executemany(
+                "INSERT INTO duplicates (url, canonical_url) VALUES (?, ?)", duplicates.items()
+            )
+
+    # --- matches ----------------------------------------------------------
+
+    def iter_matches(self, newest_first=False, with_description=True):
+        """Matches one at a time, oldest first unless `newest_first`.
+
+        Descriptions aren't stored with the match; they come from the
+        cleaned job (older rows may still carry their own copy).
+        """
+        order = "DESC" if newest_first else "ASC"
+        description = "COALESCE(c.cleaned_text, m.description)" if with_description else "NULL"
+        rows = self.conn.execute(f"""
+            SELECT m.url, m.title, m.score, {description} AS description, m.matched_at,
+                   m.is_new, m.status, m.resume, m.alternate_urls
+            FROM matches m LEFT JOIN cleaned_jobs c ON c.url = m.url
+            ORDER BY m.matched_at {order}, m.rowid {order}
+        """)
+        for row in rows:
+            yield {
+                **dict(row),
+                "is_new": bool(row["is_new"]),
+                "alternate_urls": json.loads(row["alternate_urls"] or "[]")
+            }
+
+    def get_matches(self, with_description=True):
+        """Matches as a list, oldest first."""
+        return list(self.iter_matches(with_description=with_description))
+
+    def page_matches(self, page=1, per_page=20, sort='date', status='', search='', site=''):
+        """Return (match summaries on the requested page, total matching).
+
+        Summaries leave out the description. `sort` is 'date' (newest
+        first) or 'score' (best first); `status` is 'new', 'matched' or
+        'viewed'; `search` matches the title or URL; `site` the listing site.
+        """
+        where, params = [], []
+        if status == 'new':
+            where.append("m.is_new = 1")
+        elif status:
+            where.append("m.status = ?")
+            params.append(status)
+        if search:
+            where.append("(m.title LIKE ? OR m.url LIKE ?)")
+            params += [f"%{search}%"] * 2
+        if site:
+            where.append("j.site = ?")
+            params.append(site)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        order = "m.score DESC, m.rowid DESC" if sort == 'score' else "m.matched_at DESC, m.rowid DESC"
+
+        base = f"FROM matches m LEFT JOIN jobs j ON j.url = m.url {clause}"
+        total = self.conn.execute(f"SELECT COUNT(*) {base}", params).fetchone()[0]
+        rows = self.conn.execute(f"""
+            SELECT m.url, j.site, m.title, m.score, m.matched_at, m.is_new, m.status, m.resume, m.alternate_urls
+            {base} ORDER BY {order} LIMIT ? OFFSET ?
+        """, params + [per_page, (page - 1) * per_page])
+        return [
+            {
+                **dict(row),
+                "is_new": bool(row["is_new"]),
+                "alternate_urls": json.loads(row["alternate_urls"] or "[]")
+            }
+            for row in rows
+        ], total
+
+    def get_match_description(self, url):
+        """Description shown for one match, or None if it isn't a match."""
+        row = self.conn.execute("""
+            SELECT COALESCE(c.cleaned_text, m.description) FROM matches m
+            LEFT JOIN cleaned_jobs c ON c.url = m.url WHERE m.url = ?
+        """, (url,)).fetchone()
+        return None if row is None else (row[0] or '')
+
+    def count_matches(self):
+        return self.conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+
+    def save_matches(self, matches, removed=()):
+        """Upsert this run's matches, clear older `is_new` flags, drop `removed`.
+        A match's description is read from its cleaned job, not stored again."""
+        with self.conn:
+            changes = self.conn.total_changes
+            self.conn.execute("UPDATE matches SET is_new = 0")
+            self.conn.executemany("""
+                INSERT INTO matches (url, title, score, description, matched_at, is_new, status, resume, alternate_urls)
+                VALUES (?, ?, ?, NULL, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    score = excluded.score,
+                    description = NULL,
+                    matched_at = excluded.matched_at,
+                    is_new = excluded.is_new,
+                    status = excluded.status,
+                    resume = excluded.resume,
+                    alternate_urls = excluded.alternate_urls
+            """, [
+                (m["url"], m.get("title"), m.get("score"), m.get("matched_at"),
+                 int(bool(m.get("is_new"))), m.get("status", "matched"), m.get("resume"),
+                 json.dumps(m.get("alternate_urls") or []))
+                for m in matches
+            ])
+            for chunk in _chunks(removed):
+                self.conn.execute(
+                    f"DELETE FROM matches WHERE url IN ({','.join('?' * len(chunk))})", chunk
+                )
+            self._bump_revision('matches', changes)
+
+    def mark_match_viewed(self, url):
+        """Set a match's status to viewed. Returns False if it does not exist."""
+        with self.conn:
+            changes = self.conn.total_changes
+            cursor = self.conn.execute(
+                "UPDATE matches SET status = 'viewed', is_new = 0 WHERE url = ?", (url,)
+            )
+            self._bump_revision('matches', changes)
+        return cursor.rowcount > 0
+
+    # --- run manifest -----------------------------------------------------
+
+    def mark_changed(self, stage, urls):
+        """Queue URLs that were added, modified or removed upstream of `stage`."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO pending_changes (stage, url) VALUES (?, ?)",
+                [(stage, url) for url in urls]
+            )
+
+    def get_pending(self, stage):
+        """URLs changed since `stage` last completed successfully."""
+        rows = self.conn.execute("SELECT url FROM pending_changes WHERE stage = ?", (stage,))
+        return {row[0] for row in rows}
+
+    def get_stage_info(self, stage):
+        """Bookkeeping stored by `stage` on its last successful run."""
+        row = self.conn.execute("SELECT last_run, info FROM stage_runs WHERE stage = ?", (stage,)).fetchone()
+        if row is None:
+            return {}
+        return {"last_run": row["last_run"], **json.loads(row["info"] or "{}")}
+
+    def clear_pending(self, stage, processed_urls):
+        """Clear processed URLs from the change set without recording a run."""
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM pending_changes WHERE stage = ? AND url = ?",
+                [(stage, url) for url in processed_urls]
+            )
+
+    def complete_stage(self, stage, processed_urls, **info):
+        """Clear processed URLs from the change set and record the run."""
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM pending_changes WHERE stage = ? AND url = ?",
+                [(stage, url) for url in processed_urls]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO stage_runs (stage, last_run, info) VALUES (?, ?, ?)",
+                (stage, datetime.now().isoformat(), json.dumps(info))
+            )
+
+    def save_run_metrics(self, stage, started_at, seconds, metrics):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO run_metrics (stage, started_at, seconds, metrics) VALUES (?, ?, ?, ?)",
+                (stage, started_at, seconds, json.dumps(metrics))
+            )
+
+    def recent_run_metrics(self, stage=None, limit=20):
+        """The latest runs' metrics, newest first, optionally of one stage."""
+        query = "SELECT stage, started_at, seconds, metrics FROM run_metrics"
+        params = []
+        if stage:
+            query += " WHERE stage = ?"
+            params.append(stage)
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [
+            {"stage": row["stage"], "started_at": row["started_at"], "seconds": row["seconds"],
+             **json.loads(row["metrics"] or "{}")}
+            for row in self.conn.execute(query, params)
+        ]
+
+
+class BatchWriter:
+    """Buffers results from a long-running scrape and hands them to `write`
+    in small batches, so finished work is on disk within seconds and memory
+    stays flat however long the run is.
+
+    A batch is written once it holds `batch_size` items or `interval`
+    seconds after the previous write (run `flush_periodically` alongside
+    slow producers so that also happens between items); every
+    `checkpoint_every` batches the WAL is folded back into the database.
+    Call `flush()` when done.
+    """
+
+    def __init__(self, store, write, batch_size=25, interval=5.0, checkpoint_every=20):
+        self.store = store
+        self.write = write
+        self.batch_size = batch_size
+        self.interval = interval
+        self.checkpoint_every = checkpoint_every
+        self.pending = {}
+        self.batches = 0
+        self.written = 0
+        self.last_write = time.monotonic()
+
+    def add(self, key, value):
+        self.pending[key] = value
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Write what is pending if `interval` has passed since the last write."""
+        if time.monotonic() - self.last_write >= self.interval:
+            self.flush()
+
+    async def flush_periodically(self):
+        """Call `flush_if_due` every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush_if_due()
+
+    def flush(self):
+        if self.pending:
+            batch, self.pending = self.pending, {}
+            self.write(batch)
+            self.written += len(batch)
+            self.batches += 1
+            if self.batches % self.checkpoint_every == 0:
+                self.store.checkpoint()
+        self.last_write = time.monotonic()
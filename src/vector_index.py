@@ -0,0 +1,126 @@
+import numpy as np
+
+# Below this many vectors a brute-force scan is already fast enough
+EXACT_MAX_SIZE = 50000
+
+
+def normalize(vectors):
+    """L2-normalize rows so a dot product is the cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, k):
+    """Indices of the k highest scores in a 1-D array, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class ExactIndex:
+    """Brute-force cosine search over every vector."""
+
+    def __init__(self, keys, vectors):
+        self.keys = list(keys)
+        self.vectors = normalize(vectors)
+
+    def search(self, queries, k):
+        """Top-k (key, score) lists for each query vector."""
+        scores = normalize(queries) @ self.vectors.T
+        return [
+            [(self.keys[i], float(row[i])) for i in _top_k(row, k)]
+            for row in scores
+        ]
+
+
+class IVFIndex:
+    """Inverted-file index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the `n_probe` closest buckets."""
+
+    def __init__(self, keys, vectors, n_lists=None, n_probe=8, iterations=10, seed=0):
+        self.keys = list(keys)
+        self.vectors = normalize(vectors)
+        n = self.vectors.shape[0]
+        self.n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        self.n_probe = min(n_probe, self.n_lists)
+
+        # Spherical k-means on a sample, then assign every vector
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[rng.choice(n, size=min(n, self.n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=self.n_lists, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(self.n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize(centroids)
+        self.centroids = centroids
+
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        bounds = np.searchsorted(assignment[order], np.arange(self.n_lists + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.n_lists)]
+
+    def search(self, queries, k):
+        """Approximate top-k (key, score) lists for each query vector."""
+        queries = normalize(queries)
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.n_probe]
+        results = []
+        for query, lists in zip(queries, probes):
+            candidates = np.concatenate([self.lists[c] for c in lists])
+            scores = self.vectors[candidates] @ query
+            results.append([
+                (self.keys[candidates[i]], float(scores[i])) for i in _top_k(scores, k)
+            ])
+        return results
+
+
+class ChunkIndex:
+    """Search over chunk vectors that scores each owner (job) by the mean of
+    its `chunk_k` best-matching chunks (all of them if it has fewer)."""
+
+    def __init__(self, owners, vectors, chunk_k=3, backend="auto"):
+        self.owners = list(owners)
+        self.chunk_k = chunk_k
+        self.index = build_index(range(len(self.owners)), vectors, backend)
+        rows = {}
+        for i, owner in enumerate(self.owners):
+            rows.setdefault(owner, []).append(i)
+        self.rows = {owner: np.array(r) for owner, r in rows.items()}
+
+    def search(self, queries, k):
+        """Top-k (owner, score) lists for each query vector."""
+        results = []
+        # The index only proposes candidates; over-fetch chunks so enough
+        # distinct owners survive
+        for query, hits in zip(normalize(queries), self.index.search(queries, k * self.chunk_k * 4)):
+            candidates = dict.fromkeys(self.owners[i] for i, _ in hits)
+            # Score each candidate exactly over all of its own chunks, so the
+            # score doesn't depend on which chunks the index happened to return
+            scored = []
+            for owner in candidates:
+                scores = self.index.vectors[self.rows[owner]] @ query
+                scored.append((owner, float(scores[_top_k(scores, self.chunk_k)].mean())))
+            scored.sort(key=lambda item: item[1], reverse=True)
+            results.append(scored[:k])
+        return results
+
+
+BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def build_index(keys, vectors, backend="auto"):
+    """Build a vector index; `auto` picks exact search for small corpora."""
+    if backend == "auto":
+        backend = "exact" if len(keys) <= EXACT_MAX_SIZE else "ivf"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown vector index backend: {backend}")
+    return BACKENDS[backend](keys, vectors)
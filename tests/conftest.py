@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules import each other by name from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from storage import JobStore  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """A temporary database that JobStore() opens by default, so code that
+    opens its own store (stages, metrics) never touches static/jobs.db."""
+    path = str(tmp_path / "jobs.db")
+    monkeypatch.setattr(JobStore.__init__, "__defaults__", (path,))
+    return path
+
+
+@pytest.fixture
+def store(db_path):
+    with JobStore(db_path) as store:
+        yield store
@@ -0,0 +1,121 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+import matching
+from encoding import EncodingEngine, chunk_text, pool_chunks
+from vector_index import ChunkIndex, normalize
+
+
+class FakeModel:
+    """Deterministic stand-in for a SentenceTransformer that records what it encodes."""
+
+    max_seq_length = 256
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.seen = []
+
+    def encode(self, texts, **kwargs):
+        self.seen.extend(texts)
+        rows = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+            rows.append(np.random.default_rng(seed).normal(size=self.dim))
+        return np.array(rows, dtype=np.float32)
+
+
+def test_short_text_is_a_single_chunk():
+    assert chunk_text("a few words only", window=10, overlap=2) == ["a few words only"]
+
+
+def test_chunks_overlap_and_cover_every_word():
+    words = [f"w{i}" for i in range(25)]
+
+    chunks = [chunk.split() for chunk in chunk_text(" ".join(words), window=10, overlap=3)]
+
+    assert chunks == [words[0:10], words[7:17], words[14:24], words[21:25]]
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous[-3:] == current[:3]
+
+
+def test_pool_chunks_returns_a_unit_vector():
+    vectors = np.array([[3.0, 0.0], [0.0, 1.0]])
+
+    mean = pool_chunks(vectors, "mean")
+    maxed = pool_chunks(vectors, "max")
+
+    # Chunks are normalized before pooling, so the long one doesn't dominate
+    assert mean == pytest.approx(np.array([1.0, 1.0]) / np.sqrt(2))
+    assert maxed == pytest.approx(np.array([1.0, 1.0]) / np.sqrt(2))
+    assert np.linalg.norm(pool_chunks(np.array([[1.0, 2.0], [2.0, -1.0]]), "max")) == pytest.approx(1.0)
+
+
+def test_chunk_index_scores_owner_by_mean_of_its_best_chunks():
+    rng = np.random.default_rng(0)
+    owners = [f"job{i % 30}" for i in range(300)]
+    vectors = normalize(rng.normal(size=(300, 24)))
+    query = normalize(rng.normal(size=(1, 24)))
+    index = ChunkIndex(owners, vectors, chunk_k=3, backend="exact")
+
+    hits = index.search(query, 5)[0]
+
+    for owner, score in hits:
+        scores = np.sort(vectors[[i for i, o in enumerate(owners) if o == owner]] @ query[0])[::-1]
+        assert score == pytest.approx(scores[:3].mean(), abs=1e-5)
+
+
+def test_chunk_index_score_does_not_depend_on_k():
+    rng = np.random.default_rng(1)
+    owners = [f"job{i % 50}" for i in range(400)]
+    vectors = normalize(rng.normal(size=(400, 24)))
+    query = normalize(rng.normal(size=(1, 24)))
+    index = ChunkIndex(owners, vectors, chunk_k=3, backend="exact")
+
+    narrow = dict(index.search(query, 2)[0])
+    wide = dict(index.search(query, 20)[0])
+
+    for owner, score in narrow.items():
+        assert wide[owner] == pytest.approx(score)
+
+
+def test_chunk_index_averages_all_chunks_of_owners_with_fewer_than_k():
+    vectors = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+    index = ChunkIndex(["short", "short", "single"], vectors, chunk_k=3, backend="exact")
+
+    hits = dict(index.search(np.array([[1.0, 0.0]]), 2)[0])
+
+    assert hits["short"] == pytest.approx(0.5)
+    assert hits["single"] == pytest.approx(1.0)
+
+
+@pytest.fixture
+def fake_model(tmp_path, monkeypatch):
+    (tmp_path / "static").mkdir()
+    model = FakeModel()
+    monkeypatch.setattr(matching, "BASE_DIR", str(tmp_path))
+    monkeypatch.setattr(matching, "_model_cache", model)
+    monkeypatch.setattr(matching, "_engine_cache", EncodingEngine(model, processes=1))
+    return model
+
+
+def test_later_chunks_carry_the_job_title(fake_model):
+    text = " ".join(f"word{i}" for i in range(400))
+
+    index = matching.build_job_index(["https://example.com/1"], ["Data Engineer"], [text], "exact", "topk")
+
+    chunks = chunk_text(text)
+    assert len(chunks) > 1
+    assert sorted(fake_model.seen) == sorted([chunks[0]] + [f"Data Engineer\n\n{c}" for c in chunks[1:]])
+    assert index.owners == ["https://example.com/1"] * len(chunks)
+
+
+def test_unchanged_chunks_are_not_encoded_again(fake_model):
+    text = " ".join(f"word{i}" for i in range(400))
+    matching.build_job_index(["https://example.com/1"], ["Data Engineer"], [text], "exact", "mean")
+    fake_model.seen.clear()
+
+    matching.build_job_index(["https://example.com/1"], ["Data Engineer"], [text], "exact", "mean")
+
+    assert fake_model.seen == []
@@ -0,0 +1,90 @@
+import random
+
+import dedup
+from storage import DEDUP_STAGE, MATCH_STAGE
+
+WORDS = ("python django api backend cloud data pipeline team remote senior engineer build "
+         "scale services deploy monitor review testing product customers growth mission").split()
+
+
+def posting(seed, words=120):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def edited(text, replacements=2):
+    """`text` with a couple of words changed, like a repost on another board."""
+    words = text.split()
+    for i in range(replacements):
+        words[10 + i * 40] = "lebanon"
+    return " ".join(words)
+
+
+def test_signatures_estimate_similarity():
+    text = posting(1)
+
+    assert dedup.similarity(dedup.minhash(text), dedup.minhash(text)) == 1.0
+    assert dedup.similarity(dedup.minhash(text), dedup.minhash(edited(text))) >= dedup.DUPLICATE_THRESHOLD
+    assert dedup.similarity(dedup.minhash(text), dedup.minhash(posting(2))) < 0.2
+
+
+def test_short_texts_still_get_a_signature():
+    assert dedup.minhash("Python").shape == (dedup.NUM_PERM,)
+    assert dedup.minhash("").shape == (dedup.NUM_PERM,)
+
+
+def test_clusters_point_at_the_earliest_posting():
+    base, other = posting(1), posting(2)
+    texts = {"late": edited(base), "other": other, "first": base, "later": edited(base, 3)}
+    order = ["first", "other", "late", "later"]
+    signatures = {url: dedup.minhash(texts[url]) for url in order}
+
+    assert dedup.find_clusters(order, signatures) == {"late": "first", "later": "first"}
+
+
+def test_threshold_controls_what_counts_as_a_duplicate():
+    base = posting(1)
+    signatures = {"a": dedup.minhash(base), "b": dedup.minhash(edited(base))}
+
+    assert dedup.find_clusters(["a", "b"], signatures, threshold=1.01) == {}
+
+
+def test_main_only_rehashes_changed_jobs_and_queues_moved_ones(store, monkeypatch):
+    base = posting(1)
+    store.save_cleaned({
+        "first": {"title": "Engineer", "cleaned_text": base},
+        "repost": {"title": "Engineer", "cleaned_text": edited(base)},
+        "other": {"title": "Analyst", "cleaned_text": posting(2)}
+    })
+
+    dedup.main()
+    assert store.get_duplicates() == {"repost": "first"}
+    assert store.get_pending(MATCH_STAGE) == {"repost", "first"}
+    store.clear_pending(MATCH_STAGE, store.get_pending(MATCH_STAGE))
+
+    # The repost is edited into a different job
+    hashed = []
+    monkeypatch.setattr(dedup, "minhash", lambda text, minhash=dedup.minhash: hashed.append(text) or minhash(text))
+    store.save_cleaned({"repost": {"title": "Engineer", "cleaned_text": posting(3)}})
+    store.mark_changed(DEDUP_STAGE, ["repost"])
+
+    dedup.main()
+    assert hashed == [posting(3)]
+    assert store.get_duplicates() == {}
+    assert store.get_pending(DEDUP_STAGE) == set()
+    assert store.get_pending(MATCH_STAGE) == {"repost", "first"}
+
+
+def test_duplicates_behind_a_false_positive_in_their_bucket_are_found():
+    first = dedup.minhash(posting(1))
+    # A repost that differs in one value per band except the first, so the
+    # pair only collides in band 0 (estimated similarity 113/128)
+    repost = first.copy()
+    repost[dedup.ROWS_PER_BAND::dedup.ROWS_PER_BAND] ^= 1
+    # A different posting that happens to collide in band 0 too, ahead of both
+    decoy = dedup.minhash(posting(2))
+    decoy[:dedup.ROWS_PER_BAND] = first[:dedup.ROWS_PER_BAND]
+    signatures = {"decoy": decoy, "first": first, "repost": repost}
+
+    assert dedup.similarity(first, repost) >= dedup.DUPLICATE_THRESHOLD
+    assert dedup.find_clusters(["decoy", "first", "repost"], signatures) == {"repost": "first"}
@@ -0,0 +1,71 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    """Deterministic stand-in for a model: one 4-d vector per text."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count("a"), t.count("b"), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_only_new_or_changed_texts_are_encoded(tmp_path):
+    encode = CountingEncoder()
+    cache = EmbeddingCache(str(tmp_path), "model")
+
+    assert cache.update({"x": "aa", "y": "bbb"}, encode) == 2
+    assert cache.update({"x": "aa", "y": "bbb"}, encode) == 0
+    assert cache.update({"x": "aa", "y": "abab"}, encode) == 1
+
+    assert encode.calls == [["aa", "bbb"], ["abab"]]
+    np.testing.assert_array_equal(cache.get(["y", "x"]), encode(["abab", "aa"]))
+
+
+def test_changed_text_keeps_its_row(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.update({"x": "aa", "y": "bb"}, CountingEncoder())
+    row = cache.entries["y"]["row"]
+
+    cache.update({"x": "aa", "y": "bbbb"}, CountingEncoder())
+
+    assert cache.entries["y"]["row"] == row
+
+
+def test_evicted_rows_are_reused(tmp_path):
+    encode = CountingEncoder()
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.update({"x": "a", "y": "b", "z": "ab"}, encode)
+    freed = cache.entries["y"]["row"]
+
+    assert cache.update({"x": "a", "z": "ab"}, encode) == 0
+    assert "y" not in cache.entries
+    assert cache.free_rows == [freed]
+
+    cache.update({"x": "a", "z": "ab", "w": "bbbbb"}, encode)
+
+    assert cache.entries["w"]["row"] == freed
+    assert cache.free_rows == []
+    np.testing.assert_array_equal(cache.get(["w"]), encode(["bbbbb"]))
+
+
+def test_cache_persists_across_instances(tmp_path):
+    encode = CountingEncoder()
+    EmbeddingCache(str(tmp_path), "model").update({"x": "aa", "y": "b"}, encode)
+
+    reopened = EmbeddingCache(str(tmp_path), "model")
+
+    assert reopened.update({"x": "aa", "y": "b"}, encode) == 0
+    np.testing.assert_array_equal(reopened.get(["x", "y"]), encode(["aa", "b"]))
+
+
+def test_each_model_keeps_its_own_cache(tmp_path):
+    EmbeddingCache(str(tmp_path), "model").update({"x": "aa"}, CountingEncoder())
+    EmbeddingCache(str(tmp_path), "model-torch-int8").update({"x": "aa"}, CountingEncoder())
+
+    assert EmbeddingCache(str(tmp_path), "model").update({"x": "aa"}, CountingEncoder()) == 0
+    assert EmbeddingCache(str(tmp_path), "sentence-transformers/model").update({"x": "aa"}, CountingEncoder()) == 1
@@ -0,0 +1,123 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    """Each test records into empty series and leaves the process's alone."""
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_gauges", {})
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "peak_rss", lambda: None)
+
+
+def test_render_counters_and_gauges_with_help_and_type():
+    metrics.inc("requests_total", site="bayt", outcome="ok")
+    metrics.inc("requests_total", 2, site="bayt", outcome="ok")
+    metrics.set_gauge("stage_seconds", 1.5, stage="matching")
+
+    lines = metrics.render().splitlines()
+
+    assert lines == [
+        "# HELP jobagent_requests_total Pages scraped, by outcome (ok, empty, error, timeout, throttled)",
+        "# TYPE jobagent_requests_total counter",
+        'jobagent_requests_total{outcome="ok",site="bayt"} 3',
+        "# HELP jobagent_stage_seconds Duration of the stage's last run",
+        "# TYPE jobagent_stage_seconds gauge",
+        'jobagent_stage_seconds{stage="matching"} 1.5',
+    ]
+
+
+def test_render_histogram_buckets_are_cumulative():
+    for value in (0.01, 0.2, 0.2, 3.0, 100.0):
+        metrics.observe("page_load_seconds", value, site="bayt")
+
+    lines = metrics.render().splitlines()
+
+    assert lines[:2] == [
+        "# HELP jobagent_page_load_seconds Time to load a page until its content selector appears",
+        "# TYPE jobagent_page_load_seconds histogram",
+    ]
+    buckets = {
+        line.split('le="')[1].split('"')[0]: int(line.rsplit(" ", 1)[1])
+        for line in lines if "_bucket" in line
+    }
+    assert buckets == {
+        "0.05": 1, "0.1": 1, "0.25": 3, "0.5": 3, "1": 3, "2.5": 3,
+        "5": 4, "10": 4, "30": 4, "60": 4, "+Inf": 5,
+    }
+    assert 'jobagent_page_load_seconds_bucket{site="bayt",le="+Inf"} 5' in lines
+    assert 'jobagent_page_load_seconds_count{site="bayt"} 5' in lines
+    sum_line = next(line for line in lines if line.startswith("jobagent_page_load_seconds_sum"))
+    assert float(sum_line.rsplit(" ", 1)[1]) == pytest.approx(103.41)
+
+
+def test_render_escapes_label_values():
+    metrics.inc("requests_total", site='say "hi"\\\n', outcome="ok")
+
+    assert 'site="say \\"hi\\"\\\\\\n"' in metrics.render()
+
+
+def test_render_marks_unknown_metrics_untyped():
+    metrics.inc("custom_total")
+
+    assert metrics.render().splitlines() == [
+        "# HELP jobagent_custom_total custom_total",
+        "# TYPE jobagent_custom_total untyped",
+        "jobagent_custom_total 1",
+    ]
+
+
+def test_difference_keeps_only_what_was_added():
+    metrics.inc("requests_total", 5, site="bayt", outcome="ok")
+    metrics.inc("requests_total", 1, site="bayt", outcome="empty")
+    metrics.observe("page_load_seconds", 0.2, site="bayt")
+    before = metrics.snapshot()
+
+    metrics.inc("requests_total", 2, site="bayt", outcome="ok")
+    metrics.observe("page_load_seconds", 4.0, site="bayt")
+    run = metrics.difference(metrics.snapshot(), before)
+
+    assert run["counters"] == [["requests_total", {"outcome": "ok", "site": "bayt"}, 2]]
+    [[name, labels, counts]] = run["histograms"]
+    assert counts[metrics.LATENCY_BUCKETS.index(5.0)] == 1
+    assert sum(counts[:-1]) == 1
+    assert counts[-1] == pytest.approx(4.0)
+
+
+def test_merge_adds_another_process_snapshot():
+    metrics.inc("requests_total", 1, site="bayt", outcome="ok")
+    metrics.observe("page_load_seconds", 0.2, site="bayt")
+    other = {
+        "counters": [["requests_total", {"site": "bayt", "outcome": "ok"}, 4]],
+        "gauges": [["stage_seconds", {"stage": "scrape_urls"}, 12.0]],
+        "histograms": [["page_load_seconds", {"site": "bayt"}, metrics.snapshot()["histograms"][0][2]]],
+    }
+
+    metrics.merge(other)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == [["requests_total", {"outcome": "ok", "site": "bayt"}, 5]]
+    assert snapshot["gauges"] == [["stage_seconds", {"stage": "scrape_urls"}, 12.0]]
+    assert snapshot["histograms"][0][2][-1] == pytest.approx(0.4)
+
+
+def test_stage_run_saves_what_the_stage_recorded(db_path):
+    from storage import JobStore
+
+    metrics.inc("stage_items_total", 99, stage="dedup")
+    with metrics.stage_run("dedup"):
+        metrics.inc("stage_items_total", 7, stage="dedup")
+        metrics.inc("requests_total", 3, stage="dedup", site="bayt", outcome="ok")
+        metrics.inc("requests_total", 1, stage="dedup", site="bayt", outcome="empty")
+        metrics.inc("stage_items_total", 5, stage="matching")
+
+    with JobStore() as store:
+        [run] = store.recent_run_metrics("dedup")
+    counters = {(name, tuple(sorted(labels.items()))): value for name, labels, value in run["counters"]}
+    assert counters[("stage_items_total", (("stage", "dedup"),))] == 7
+    assert counters[("stage_runs_total", (("stage", "dedup"),))] == 1
+    assert all(labels.get("stage") == "dedup" for _, labels, _ in run["counters"])
+    assert run["rates"]["bayt"] == {"requests": 4, "success_rate": 0.75, "empty_rate": 0.25}
+    assert run["seconds"] >= 0
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+import scheduler
+from scheduler import SiteLimiter, SiteScheduler, TokenBucket, OK, EMPTY, ERROR, TIMEOUT, THROTTLED
+
+
+def test_timeouts_halve_concurrency_and_double_backoff():
+    limiter = SiteLimiter("site", max_concurrency=8)
+
+    limiter.start()
+    limiter.finish(TIMEOUT)
+    assert (limiter.limit, limiter.backoff) == (4, scheduler.BACKOFF_BASE)
+
+    limiter.start()
+    limiter.finish(THROTTLED)
+    assert (limiter.limit, limiter.backoff) == (2, scheduler.BACKOFF_BASE * 2)
+
+    for _ in range(10):
+        limiter.start()
+        limiter.finish(TIMEOUT)
+    assert (limiter.limit, limiter.backoff) == (1, scheduler.BACKOFF_MAX)
+
+
+def test_backoff_blocks_the_site_until_it_expires():
+    limiter = SiteLimiter("site")
+    limiter.start()
+    limiter.finish(TIMEOUT)
+
+    assert limiter.wait_time(limiter.blocked_until - 1.0) == pytest.approx(1.0)
+    assert limiter.wait_time(limiter.blocked_until) == 0.0
+
+
+def test_success_grows_concurrency_back_by_one_up_to_the_maximum():
+    limiter = SiteLimiter("site", max_concurrency=4)
+    limiter.start()
+    limiter.finish(TIMEOUT)
+    assert limiter.limit == 2
+
+    for expected in (3, 4, 4):
+        limiter.start()
+        limiter.finish(OK)
+        assert limiter.limit == expected
+    assert limiter.backoff == 0.0
+
+
+def test_empty_and_error_results_leave_the_limit_alone():
+    limiter = SiteLimiter("site", max_concurrency=4)
+    limiter.start()
+    limiter.finish(TIMEOUT)
+
+    for outcome in (EMPTY, ERROR):
+        limiter.start()
+        limiter.finish(outcome)
+    assert limiter.limit == 2
+
+
+def test_no_slot_when_all_are_busy():
+    limiter = SiteLimiter("site", max_concurrency=2)
+    limiter.start()
+    limiter.start()
+    assert limiter.wait_time(0.0) is None
+
+    limiter.finish(OK)
+    assert limiter.wait_time(0.0) == 0.0
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    bucket = TokenBucket(rate=2, burst=1)
+    bucket.updated = 0.0
+
+    assert bucket.wait_time(0.0) == 0.0
+    bucket.take()
+    assert bucket.wait_time(0.0) == 0.5
+    assert bucket.wait_time(0.5) == 0.0
+
+
+def drain(site_scheduler, outcomes):
+    """Run one worker, reporting `outcomes[item]` (popped in order) for each item."""
+    async def run():
+        handled = []
+        while (task := await site_scheduler.next()) is not None:
+            site, item = task
+            handled.append(item)
+            site_scheduler.done(site, item, outcomes[item].pop(0))
+        return handled
+    return asyncio.run(run())
+
+
+def test_throttled_items_are_retried_once(monkeypatch):
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE", 0.001)
+    site_scheduler = SiteScheduler({"site": SiteLimiter("site")})
+    for item in ("a", "b"):
+        site_scheduler.add("site", item)
+
+    handled = drain(site_scheduler, {"a": [THROTTLED, THROTTLED], "b": [TIMEOUT, OK]})
+
+    assert handled == ["a", "b", "a", "b"]
+
+
+def test_retries_are_counted_per_key_not_per_object(monkeypatch):
+    monkeypatch.setattr(scheduler, "BACKOFF_BASE", 0.001)
+    site_scheduler = SiteScheduler({"site": SiteLimiter("site")}, key=lambda job: job["url"])
+    site_scheduler.add("site", {"url": "a"})
+
+    async def run():
+        handled = 0
+        while (task := await site_scheduler.next()) is not None:
+            handled += 1
+            # Report an equal but new object each time, as after a requeue elsewhere
+            site_scheduler.done(task[0], dict(task[1]), THROTTLED)
+            if handled > 5:
+                break
+        return handled
+
+    assert asyncio.run(run()) == 2
+
+
+def test_busy_site_does_not_hold_back_other_sites():
+    site_scheduler = SiteScheduler({
+        "slow": SiteLimiter("slow", max_concurrency=1),
+        "fast": SiteLimiter("fast", max_concurrency=4)
+    })
+    for i in range(3):
+        site_scheduler.add("slow", f"slow-{i}")
+        site_scheduler.add("fast", f"fast-{i}")
+
+    async def take(n):
+        return [await site_scheduler.next() for _ in range(n)]
+
+    # The slow site's only slot stays busy, but fast items keep coming
+    taken = asyncio.run(take(4))
+    assert [site for site, _ in taken].count("slow") == 1
+    assert [site for site, _ in taken].count("fast") == 3
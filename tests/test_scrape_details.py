@@ -0,0 +1,103 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+from bs4 import BeautifulSoup
+
+from scheduler import EMPTY, OK, THROTTLED
+from scrape_details import EXPIRED, NOT_MODIFIED, element_text, fetch_with_http
+
+FIXTURE = (Path(__file__).parent / "fixtures" / "job_detail.html").read_text()
+SELECTORS = {"title": "h1.job-title", "description": "div.job-description", "expired": ".job-expired"}
+URL = "https://jobs.example.com/job/123"
+
+EXPECTED_DESCRIPTION = "\n".join([
+    "We are hiring a Senior Data Engineer to join our team in Dubai.",
+    "Requirements",
+    "5+ years of Python",
+    "Experience with Spark and Airflow",
+    "Salary: competitive",
+    "Location: Dubai, UAE",
+])
+
+
+def fetch(handler, selectors=SELECTORS, previous=None):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_with_http(client, URL, selectors, previous)
+    return asyncio.run(run())
+
+
+def test_element_text_follows_inner_text():
+    soup = BeautifulSoup(FIXTURE, "html.parser")
+
+    assert element_text(soup.select_one("h1.job-title")) == "Senior Data Engineer"
+    assert element_text(soup.select_one("div.job-description")) == EXPECTED_DESCRIPTION
+
+
+def test_fetch_extracts_title_and_description():
+    def handler(request):
+        return httpx.Response(200, text=FIXTURE, headers={"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 10:00:00 GMT"})
+
+    outcome, title, description, validators = fetch(handler)
+
+    assert outcome == OK
+    assert title == "Senior Data Engineer"
+    assert description == EXPECTED_DESCRIPTION
+    assert validators == {"etag": '"v1"', "last_modified": "Mon, 05 Oct 2026 10:00:00 GMT"}
+
+
+def test_fetch_is_conditional_on_previous_validators():
+    sent = {}
+
+    def handler(request):
+        sent.update(request.headers)
+        return httpx.Response(304, headers={"ETag": '"v1"'})
+
+    previous = {"etag": '"v1"', "last_modified": "Mon, 05 Oct 2026 10:00:00 GMT"}
+    outcome, title, description, _ = fetch(handler, previous=previous)
+
+    assert (outcome, title, description) == (NOT_MODIFIED, "", "")
+    assert sent["if-none-match"] == '"v1"'
+    assert sent["if-modified-since"] == "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+def test_fetch_without_validators_is_unconditional():
+    sent = {}
+
+    def handler(request):
+        sent.update(request.headers)
+        return httpx.Response(200, text=FIXTURE)
+
+    fetch(handler, previous={"etag": None, "last_modified": None})
+
+    assert "if-none-match" not in sent
+    assert "if-modified-since" not in sent
+
+
+def test_fetch_maps_statuses_to_outcomes():
+    for status, expected in [(404, EXPIRED), (410, EXPIRED), (429, THROTTLED), (503, THROTTLED)]:
+        outcome, _, _, _ = fetch(lambda request: httpx.Response(status))
+        assert outcome == expected, status
+
+
+def test_fetch_reports_expired_banner():
+    page = FIXTURE.replace("<body>", '<body><div class="job-expired">This job is no longer available</div>')
+
+    outcome, title, description, _ = fetch(lambda request: httpx.Response(200, text=page))
+
+    assert (outcome, title, description) == (EXPIRED, "", "")
+
+
+def test_fetch_without_matching_selectors_is_empty():
+    selectors = {"title": "h1.missing", "description": "div.missing"}
+
+    outcome, title, description, _ = fetch(lambda request: httpx.Response(200, text=FIXTURE), selectors)
+
+    assert (outcome, title, description) == (EMPTY, "", "")
+
+
+def test_element_text_keeps_line_breaks_inside_pre():
+    soup = BeautifulSoup("<div>Apply\nnow<pre>line one\nline two</pre></div>", "html.parser")
+
+    assert element_text(soup.div) == "Apply now\nline one\nline two"
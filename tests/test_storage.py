@@ -0,0 +1,91 @@
+import sqlite3
+
+from storage import JobStore, ADDED_COLUMNS, CLEAN_STAGE, MATCH_STAGE
+
+
+def columns(store, table):
+    return {row["name"] for row in store.conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migration_adds_missing_columns_and_keeps_rows(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE jobs (url TEXT PRIMARY KEY, site TEXT NOT NULL, found_at TEXT);
+        CREATE TABLE job_details (url TEXT PRIMARY KEY, title TEXT, description TEXT,
+                                  scraped_at TEXT, seen INTEGER NOT NULL DEFAULT 0, last_seen TEXT);
+        CREATE TABLE matches (url TEXT PRIMARY KEY, title TEXT, score REAL, description TEXT,
+                              matched_at TEXT, is_new INTEGER NOT NULL DEFAULT 1,
+                              status TEXT NOT NULL DEFAULT 'matched');
+        INSERT INTO jobs VALUES ('https://a/1', 'a', '2025-01-01');
+        INSERT INTO job_details (url, title, description) VALUES ('https://a/1', 'Engineer', 'Python');
+    """)
+    conn.commit()
+    conn.close()
+
+    with JobStore(path) as store:
+        for table, added in ADDED_COLUMNS.items():
+            assert set(added) <= columns(store, table)
+        assert store.get_details()["https://a/1"]["title"] == "Engineer"
+        assert [job["url"] for job in store.iter_jobs()] == ["https://a/1"]
+
+    # Opening an up-to-date database again is a no-op
+    with JobStore(path) as store:
+        assert store.count_details() == 1
+
+
+def test_pending_changes_manifest(store):
+    store.mark_changed(CLEAN_STAGE, ["u1", "u2"])
+    store.mark_changed(CLEAN_STAGE, ["u2", "u3"])
+    store.mark_changed(MATCH_STAGE, ["u1"])
+
+    assert store.get_pending(CLEAN_STAGE) == {"u1", "u2", "u3"}
+    assert store.get_pending(MATCH_STAGE) == {"u1"}
+
+    store.clear_pending(CLEAN_STAGE, ["u1"])
+    assert store.get_pending(CLEAN_STAGE) == {"u2", "u3"}
+    assert store.get_stage_info(CLEAN_STAGE) == {}
+
+    store.complete_stage(CLEAN_STAGE, ["u2", "u3"], threshold=0.5)
+    assert store.get_pending(CLEAN_STAGE) == set()
+    assert store.get_pending(MATCH_STAGE) == {"u1"}
+    info = store.get_stage_info(CLEAN_STAGE)
+    assert info["threshold"] == 0.5 and info["last_run"]
+
+
+def test_upsert_details_keeps_stored_values_for_missing_fields(store):
+    store.upsert_details({"u": {
+        "title": "Engineer", "description": "Python", "scraped_at": "t1",
+        "content_hash": "h1", "etag": "e1", "seen": True, "last_seen": "t1"
+    }})
+
+    # A refresh that found the page unchanged only sends validators
+    store.upsert_details({"u": {"checked_at": "t2", "etag": "e2"}})
+
+    detail = store.get_details()["u"]
+    assert (detail["title"], detail["description"], detail["scraped_at"], detail["last_seen"]) == \
+        ("Engineer", "Python", "t1", "t1")
+    state = store.get_refresh_state()["u"]
+    assert (state["content_hash"], state["etag"], state["checked_at"]) == ("h1", "e2", "t2")
+
+
+def test_upsert_details_always_writes_expired_at(store):
+    store.upsert_details({"u": {"title": "Engineer", "description": "Python"}})
+
+    store.upsert_details({"u": {"expired_at": "t2"}})
+    assert store.detail_urls(include_expired=False) == set()
+    assert store.get_details()["u"]["title"] == "Engineer"
+
+    # Leaving expired_at out revives the posting
+    store.upsert_details({"u": {"checked_at": "t3"}})
+    assert store.detail_urls(include_expired=False) == {"u"}
+
+
+def test_upsert_details_queues_only_changed_details(store):
+    store.upsert_details({
+        "changed": {"title": "A", "description": "x", "changed": True},
+        "same": {"title": "B", "description": "y"}
+    }, changed_stage=CLEAN_STAGE)
+
+    assert store.detail_urls() == {"changed", "same"}
+    assert store.get_pending(CLEAN_STAGE) == {"changed"}
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import ExactIndex, IVFIndex, build_index, normalize
+
+
+def clustered(n, dim=32, clusters=20, seed=0):
+    """Unit vectors scattered around `clusters` random centres, like embeddings of similar postings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim))
+    return normalize(centres[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+def brute_force(vectors, queries, k):
+    scores = normalize(queries) @ normalize(vectors).T
+    return [list(np.argsort(-row)[:k]) for row in scores]
+
+
+def test_exact_index_returns_the_true_top_k_best_first():
+    vectors = clustered(500)
+    queries = clustered(5, seed=1)
+
+    results = ExactIndex(range(500), vectors).search(queries, 10)
+
+    for hits, expected in zip(results, brute_force(vectors, queries, 10)):
+        assert [key for key, _ in hits] == expected
+        scores = [score for _, score in hits]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_ivf_recall_against_exact_search():
+    vectors = clustered(3000)
+    queries = clustered(50, seed=1)
+
+    results = IVFIndex(range(3000), vectors).search(queries, 10)
+
+    recall = np.mean([
+        len({key for key, _ in hits} & set(expected)) / 10
+        for hits, expected in zip(results, brute_force(vectors, queries, 10))
+    ])
+    assert recall >= 0.9
+
+
+def test_ivf_scores_are_exact_cosines():
+    vectors = clustered(1000)
+    query = clustered(1, seed=1)
+
+    for key, score in IVFIndex(range(1000), vectors).search(query, 5)[0]:
+        assert score == pytest.approx(float(normalize(vectors)[key] @ normalize(query)[0]), abs=1e-5)
+
+
+def test_build_index_picks_exact_search_for_small_corpora(monkeypatch):
+    monkeypatch.setattr(vector_index, "EXACT_MAX_SIZE", 100)
+
+    assert isinstance(build_index(range(100), clustered(100)), ExactIndex)
+    assert isinstance(build_index(range(101), clustered(101)), IVFIndex)
+    assert isinstance(build_index(range(101), clustered(101), "exact"), ExactIndex)
+    with pytest.raises(ValueError):
+        build_index(range(10), clustered(10), "hnsw")
+
+
+def test_k_larger_than_the_corpus_returns_everything():
+    results = ExactIndex(["a", "b", "c"], clustered(3)).search(clustered(1, seed=1), 10)
+
+    assert sorted(key for key, _ in results[0]) == ["a", "b", "c"]